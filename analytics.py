@@ -0,0 +1,150 @@
+import threading
+from collections import Counter, deque
+
+import numpy as np
+import pandas as pd
+
+from attendance import session_key
+
+# ==========================================
+# 📊 签到统计 (增量聚合, Admin → Analytics)
+# ==========================================
+
+RECENT_N = 5
+
+
+def _key(session_data):
+    """统计按分区 (session id) 分开, 同名的新旧 session 不混在一起"""
+    return session_key(session_data.get('id'), session_data['name'])
+
+
+class SessionStats:
+    __slots__ = ('total', 'status', 'types', 'per_minute', 'names', 'arrived', 'recent')
+
+    def __init__(self):
+        self.total = 0
+        self.status = Counter()
+        self.types = Counter()
+        self.per_minute = Counter()
+        self.names = set()
+        self.arrived = []   # 第一次出现的名字, 按到达顺序 (到场 mask 只需处理新增部分)
+        self.recent = deque(maxlen=RECENT_N)
+
+    def add(self, row):
+        self.total += 1
+        self.status[row['Status']] += 1
+        self.types[row['Type']] += 1
+        self.per_minute[row['Timestamp'][:16]] += 1   # "YYYY-MM-DD HH:MM"
+        self.recent.append((row['Name'], row['Timestamp']))
+        if row['Name'] not in self.names:
+            self.names.add(row['Name'])
+            self.arrived.append(row['Name'])
+
+
+class AttendanceStats:
+    """跟 LogTailer 一样按 seq 增量读库; 每个 session (按分区) 的计数 / 每分钟到达 / 已到名单常驻内存"""
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._masks = {}
+        self._roster_frame = (None, None, None)
+        self._reset()
+
+    def _reset(self):
+        self._last_seq = 0
+        self._sessions = {}
+
+    def invalidate(self):
+        """库里已有的行被改了 (比如重新判迟到), 下次 poll 从头重建"""
+        with self._lock:
+            self._reset()
+            self._cache.clear()
+            self._masks.clear()
+
+    def poll(self):
+        """只读上次之后的新行; 库被替换 (seq 倒退) 时从头重建。返回当前 seq"""
+        with self._lock:
+            rows = self.store.rows_after(self._last_seq)
+            if not rows and self.store.max_seq() < self._last_seq:
+                self._reset()
+                self._cache.clear()
+                self._masks.clear()
+                rows = self.store.rows_after(0)
+            for row in rows:
+                key = session_key(row.get('session_id'), row['Session'])
+                s = self._sessions.get(key)
+                if s is None: s = self._sessions[key] = SessionStats()
+                s.add(row)
+            if rows: self._last_seq = rows[-1]['_seq']
+            return self._last_seq
+
+    def summary(self, session_data):
+        """{total, on_time, late, walk_in, arrivals: DataFrame[Minute, Arrivals]}"""
+        with self._lock:
+            s = self._sessions.get(_key(session_data)) or SessionStats()
+            per_minute = sorted(s.per_minute.items())
+            result = {"total": s.total, "on_time": s.status.get("On-time", 0),
+                      "late": s.status.get("Late", 0), "walk_in": s.types.get("Walk-in", 0)}
+        result["arrivals"] = pd.DataFrame(per_minute, columns=["Minute", "Arrivals"])
+        return result
+
+    def overview(self, sessions, since=None):
+        """指挥中心: 所有 session (dict, 按分区找计数) 共用一次 poll, 每个 session 只读内存里的计数。
+        [{session, total, on_time, late, late_pct, walk_in, recent_count, recent: [(Name, Timestamp)] 新的在前}];
+        recent_count = since ("YYYY-MM-DD HH:MM") 之后的到达数"""
+        self.poll()
+        out = []
+        with self._lock:
+            for session_data in sessions:
+                s = self._sessions.get(_key(session_data)) or SessionStats()
+                late = s.status.get("Late", 0)
+                out.append({"session": session_data['name'], "total": s.total, "on_time": s.status.get("On-time", 0), "late": late,
+                            "late_pct": round(late / s.total * 100) if s.total else 0, "walk_in": s.types.get("Walk-in", 0),
+                            "recent_count": sum(n for m, n in s.per_minute.items() if since is None or m >= since),
+                            "recent": list(reversed(s.recent))})
+        return out
+
+    def _frame(self, roster):
+        """名单 DataFrame (按名字排序) 和 名字 -> 行号 索引, 每份名单只建一次"""
+        key, frame, positions = self._roster_frame
+        if key is not roster:
+            frame = roster.to_frame()
+            if 'Category' not in frame.columns: frame['Category'] = 'Unknown'
+            frame = frame.sort_values('Name', ignore_index=True)
+            positions = frame.groupby('Name', sort=False).indices
+            self._roster_frame = (roster, frame, positions)
+        return frame, positions
+
+    def _present_mask(self, key, roster, frame, positions):
+        """名单上每一行是否已到; 只把上次之后新到的名字标上"""
+        with self._lock:
+            entry = self._masks.get(key)
+            if entry is None or entry[0] is not roster:
+                entry = self._masks[key] = [roster, np.zeros(len(frame), dtype=bool), 0]
+            s = self._sessions.get(key)
+            new_names = s.arrived[entry[2]:] if s else []
+            for name in new_names:
+                idx = positions.get(name)
+                if idx is not None: entry[1][idx] = True
+            entry[2] += len(new_names)
+            return entry[1].copy()
+
+    def coverage(self, session_data, roster):
+        """(按 Category 的到场率, 未到名单); 库和名单都没变时直接用上次的结果"""
+        seq = self.poll()
+        key, cache_key = _key(session_data), (seq, id(roster))
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == cache_key: return cached[1]
+
+        frame, positions = self._frame(roster)
+        present = self._present_mask(key, roster, frame, positions)
+        by_cat = (frame[['Category']].assign(Present=present).groupby('Category', sort=True)['Present']
+                  .agg(Registered='size', Arrived='sum').reset_index())
+        by_cat['Coverage %'] = (by_cat['Arrived'] / by_cat['Registered'] * 100).round(1)
+        cols = [c for c in ('Name', 'Category', 'Email') if c in frame.columns]
+        absent = frame.loc[~present, cols].reset_index(drop=True)
+        result = (by_cat, absent)
+        self._cache[key] = (cache_key, result)
+        return result
@@ -1,14 +1,12 @@
-import streamlit as st
-from streamlit_gsheets import GSheetsConnection
-import pandas as pd
-from datetime import datetime, timedelta
 import time
-import json
-import os
-import qrcode
-from PIL import Image
-import io
+_rerun_t0 = time.perf_counter()
+import streamlit as st
 import random
+from datetime import datetime, timedelta
+from attendance import session_key
+from core import Backend, kl_now, verify_ic
+from assets import AssetCache, minify_css
+from badges import build_badge_bundle
 
 # ==========================================
 # 🎨 1. PREMIUM UI 配置 (由 AI 设计)
@@ -16,9 +14,8 @@ import random
 
 st.set_page_config(page_title="DFMA Check-in", page_icon="💎", layout="wide")
 
-# 加载高级 CSS 样式
-st.markdown("""
-<style>
+# 加载高级 CSS 样式 (常量; 每次 rerun 都得重发, 所以发压缩过的)
+APP_CSS = """
     /* 引入高级字体 Inter */
     @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;700&display=swap');
     
@@ -150,69 +147,80 @@ st.markdown("""
         justify-content: space-between;
         align-items: center;
     }
-</style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(f"<style>{minify_css(APP_CSS)}</style>", unsafe_allow_html=True)
 
-# 基础配置
-SESSION_FILE = "sessions.json"
-BACKUP_FILE = "local_backup_logs.csv"
-LOCAL_NAMELIST = "local_namelist.csv"
+# 基础配置 (数据文件名见 core.py)
+ROSTER_TTL = 600   # 秒, 过期后后台刷新
+SERVER_SIDE_SEARCH = True   # 名字在服务器端搜索, 只把 top-k 发给手机
+NAME_SEARCH_TOP_K = 8
 LOGO_FILE = "logo.png"
 ADMIN_PASSWORD = "admin"
+LATE_BUFFERS = ["15m", "30m", "1hr"]
 APP_URL = "https://dfma-checkin-app-2026.streamlit.app"
+QR_DEEP_LINK = True   # 投屏 QR 带上签到码, 扫码后不用再输入
+ASSET_CACHE_SIZE = 64
+FEED_SIZE = 8
+PROJECTION_REFRESH_SECS = 1   # 投屏检查新签到的间隔 (没变化时几乎不花 CPU)
+COMMAND_RECENT_MINUTES = 10   # 指挥中心 "最近 N 分钟到达"
+CLOUD_FLUSH_INTERVAL = 5   # 秒
+CLOUD_FLUSH_SIZE = 50      # 攒够多少行立即 flush
+PERF_ENABLED = True        # 热路径计时 (Admin → Performance 可关)
 
 # ==========================================
 # 🛠️ 2. 核心逻辑 (High Traffic & Logic Fixes)
 # ==========================================
 
-# --- Session 管理 ---
+# --- 共享后端 (核心逻辑在 core.py) ---
+def connect_gsheets():
+    """第一次真正读写 Sheets 时才调用 (gspread / google-auth import 很慢)"""
+    from streamlit_gsheets import GSheetsConnection
+    return st.connection("gsheets", type=GSheetsConnection)
+
+def badge_secret_setting():
+    """st.secrets["badge_secret"] (没有 secrets.toml 时返回 None, 退回环境变量 / key 文件)"""
+    try: return st.secrets.get("badge_secret")
+    except Exception: return None
+
+@st.cache_resource
+def get_backend():
+    """全进程一份: 签到库 / session 表 / 名单 / 云端队列 (Sheets 连接等第一次用到才建)"""
+    t0 = time.perf_counter()
+    backend = Backend(None, connect=connect_gsheets, feed_size=FEED_SIZE, roster_ttl=ROSTER_TTL,
+                      cloud_flush_interval=CLOUD_FLUSH_INTERVAL, cloud_flush_size=CLOUD_FLUSH_SIZE,
+                      perf_enabled=PERF_ENABLED, badge_secret=badge_secret_setting())
+    if backend.perf.enabled: backend.perf.record("startup.backend_init", time.perf_counter() - t0)
+    return backend
+
+def get_session_registry(): return get_backend().sessions
+def get_store(): return get_backend().store
+def get_log_tailer(): return get_backend().tailer
+def get_stats(): return get_backend().stats
+def get_change_notifier(): return get_backend().notifier
+def get_cloud_queue(): return get_backend().cloud_queue
+def get_roster_provider(): return get_backend().roster_provider
+def get_perf(): return get_backend().perf
+
 def load_sessions():
-    if os.path.exists(SESSION_FILE):
-        with open(SESSION_FILE, 'r') as f: return json.load(f)
-    return []
-
-def save_sessions(sessions):
-    with open(SESSION_FILE, 'w') as f: json.dump(sessions, f)
-
-# --- 数据读取 (IC 验证支持) ---
-conn = st.connection("gsheets", type=GSheetsConnection)
-
-@st.cache_data(ttl=600)
-def get_participants_data():
-    """读取 Name, Email, Category, IC"""
-    try:
-        df = conn.read(worksheet="Participants", usecols=[0, 1, 2, 3])
-        current_cols = df.columns.tolist()
-        expected_cols = ['Name', 'Email', 'Category', 'IC']
-        
-        rename_map = {}
-        for i in range(min(len(current_cols), 4)):
-            rename_map[current_cols[i]] = expected_cols[i]
-        df = df.rename(columns=rename_map)
-        
-        for col in expected_cols:
-            if col not in df.columns: df[col] = '-'
-            
-        # 清洗 IC (去除 .0 和空格)
-        df = df.astype(str)
-        if 'IC' in df.columns:
-            df['IC'] = df['IC'].str.replace(r'\.0$', '', regex=True).str.strip()
-
-        return df.dropna(subset=['Name'])
-    except Exception:
-        if os.path.exists(LOCAL_NAMELIST):
-            try:
-                df = pd.read_csv(LOCAL_NAMELIST).astype(str)
-                if 'IC' in df.columns:
-                    df['IC'] = df['IC'].str.replace(r'\.0$', '', regex=True).str.strip()
-                return df
-            except: pass
-        return pd.DataFrame(columns=['Name', 'Email', 'Category', 'IC'])
-
-def get_logs_data():
-    if os.path.exists(BACKUP_FILE): return pd.read_csv(BACKUP_FILE)
-    try: return conn.read(worksheet="Logs", ttl=0)
-    except: return pd.DataFrame()
+    return get_session_registry().all()
+
+def get_roster():
+    """全进程共用一份只读名单 (不会每次调用都 pickle 一份 DataFrame)"""
+    return get_backend().get_roster()
+
+@st.cache_resource
+def get_asset_cache():
+    """QR / Logo 的 PNG bytes 全进程共用, 只生成一次"""
+    return AssetCache(maxsize=ASSET_CACHE_SIZE)
+
+def session_start(session):
+    """sessions.json 里的 date/start -> datetime (编辑表单的默认值)"""
+    try: return datetime.strptime(f"{session['date']} {session['start']}"[:16], "%Y-%m-%d %H:%M")
+    except (KeyError, ValueError): return kl_now().replace(second=0, microsecond=0)
+
+def session_link(session):
+    """带签到码的深链接, 打开后 HOME 自动填好 code"""
+    return f"{APP_URL}/?code={session['code']}"
 
 # --- 名字打码 ---
 def mask_name_smart(name):
@@ -221,61 +229,31 @@ def mask_name_smart(name):
     return "****" + name[-5:]
 
 # --- 状态写入 ---
-def calculate_status(session_data):
-    kl_time = datetime.utcnow() + timedelta(hours=8)
-    try:
-        start_str = f"{session_data['date']} {session_data['start']}"
-        session_start = datetime.strptime(start_str, "%Y-%m-%d %H:%M")
-        dur_str = str(session_data.get('duration', '1hr'))
-        if 'hr' in dur_str: mins = int(float(dur_str.replace('hr','')) * 60)
-        else: mins = int(dur_str.replace('m',''))
-        late_threshold = session_start + timedelta(minutes=mins)
-        if kl_time > late_threshold: return "Late"
-        return "On-time"
-    except: return "On-time"
-
 def write_log(session_data, name, user_type, email="-", phone="-"):
-    kl_time = datetime.utcnow() + timedelta(hours=8)
-    timestamp_str = kl_time.strftime("%Y-%m-%d %H:%M:%S")
-    status = calculate_status(session_data)
-
-    new_data = pd.DataFrame([{
-        "Timestamp": timestamp_str,
-        "Session": session_data['name'],
-        "Name": name,
-        "Type": user_type,
-        "Status": status,
-        "Email": email,
-        "Phone": phone
-    }])
-
-    if not os.path.exists(BACKUP_FILE):
-        new_data.to_csv(BACKUP_FILE, index=False)
-    else:
-        new_data.to_csv(BACKUP_FILE, mode='a', header=False, index=False)
-
-    if st.session_state.get('high_traffic_mode', True):
-        return True, status
-
-    try:
-        existing_data = conn.read(worksheet="Logs", ttl=0)
-        updated_df = pd.concat([existing_data, new_data], ignore_index=True)
-        conn.update(worksheet="Logs", data=updated_df)
-    except: pass
-
-    return True, status
+    high_traffic = st.session_state.get('high_traffic_mode', True)
+    return get_backend().write_log(session_data, name, user_type, email, phone, high_traffic=high_traffic)
 
 def sync_local_to_cloud():
-    if not os.path.exists(BACKUP_FILE): return "No local data."
-    try:
-        local = pd.read_csv(BACKUP_FILE)
-        try:
-            cloud = conn.read(worksheet="Logs", ttl=0)
-            combined = pd.concat([cloud, local]).drop_duplicates(subset=['Timestamp', 'Name'], keep='last')
-        except: combined = local
-        conn.update(worksheet="Logs", data=combined)
-        return f"✅ Synced {len(local)} records!"
-    except Exception as e: return f"❌ Error: {e}"
+    return get_backend().sync_local_to_cloud()
+
+def report_jobs():
+    """报表任务列表; 有任务在跑时每 2 秒刷新, 跑完了整页刷新一次停掉定时"""
+    reports = get_backend().reports
+    for job in reports.jobs()[:5]:
+        c_a, c_b = st.columns([3, 1])
+        if job['state'] == "running":
+            c_a.caption(f"⏳ {job['label']} · {job['format']} · building...")
+        elif job['state'] == "failed":
+            c_a.caption(f"⚠️ {job['label']} · {job['error']}")
+        else:
+            c_a.caption(f"📑 {job['label']} · {job['rows']} rows · {job['seconds']:.1f}s")
+            mime = "application/zip" if job['format'] == "csv" else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            c_b.download_button("Download", lambda job_id=job['id']: reports.read(job_id),
+                                job['filename'], mime=mime, key=f"rp{job['id']}")
+    if st.session_state.get('_reports_busy') and not reports.busy():
+        st.session_state._reports_busy = False
+        st.rerun()
+    st.session_state._reports_busy = reports.busy()
 
 # ==========================================
 # 🖥️ 3. 界面渲染
@@ -284,6 +262,7 @@ def sync_local_to_cloud():
 if 'page' not in st.session_state: st.session_state.page = 'HOME'
 if 'current_user' not in st.session_state: st.session_state.current_user = None
 if 'high_traffic_mode' not in st.session_state: st.session_state.high_traffic_mode = True 
+if 'projection_refresh' not in st.session_state: st.session_state.projection_refresh = PROJECTION_REFRESH_SECS
 
 sessions = load_sessions()
 active_sessions = [s for s in sessions if s.get('active', True)]
@@ -296,13 +275,16 @@ with st.sidebar:
     mode = st.toggle("🚀 High Traffic Mode", value=st.session_state.high_traffic_mode)
     st.session_state.high_traffic_mode = mode
     if mode: st.caption("✅ Local Save (Fast)")
-    else: st.caption("⚠️ Cloud Sync (Slow)")
+    else:
+        cq = get_cloud_queue()
+        st.caption(f"☁️ Cloud Sync (batched) · {cq.pending_count()} pending")
+        if cq.last_error: st.caption(f"⚠️ Retrying: {cq.last_error}")
     st.divider()
 
     if st.text_input("Password", type="password") == ADMIN_PASSWORD:
         st.success("Unlocked")
         
-        tab1, tab2 = st.tabs(["Manage", "Data"])
+        tab1, tab2, tab3, tab4 = st.tabs(["Manage", "Data", "Analytics", "Performance"])
         
         with tab1:
             st.subheader("New Session")
@@ -310,7 +292,7 @@ with st.sidebar:
             c1, c2 = st.columns(2)
             s_date = c1.date_input("Date")
             s_time = c2.time_input("Start")
-            s_dur = st.selectbox("Late Buffer", ["15m", "30m", "1hr"])
+            s_dur = st.selectbox("Late Buffer", LATE_BUFFERS)
             
             if st.button("Create Session"):
                 new_s = {
@@ -322,23 +304,47 @@ with st.sidebar:
                     "duration": s_dur,
                     "active": True
                 }
-                sessions.append(new_s)
-                save_sessions(sessions)
-                st.rerun()
+                try:
+                    get_session_registry().add(new_s)
+                    st.rerun()
+                except ValueError as e: st.error(str(e))
             
             st.markdown("### Active Sessions")
+            if st.button("🛰️ Command center", disabled=not active_sessions):
+                st.session_state.page = 'COMMAND'
+                st.rerun()
+            st.session_state.projection_refresh = st.slider("Projection refresh (s)", 1, 10, st.session_state.projection_refresh)
             for s in active_sessions:
                 with st.container(border=True):
                     st.write(f"**{s['name']}**")
-                    c_a, c_b = st.columns([2, 1])
+                    c_a, c_k, c_b = st.columns([2, 2, 1])
                     if c_a.button("📽️ Project", key=f"p{s['id']}"):
                         st.session_state.project_session = s
                         st.session_state.page = 'PROJECTION'
                         st.rerun()
+                    if c_k.button("🎫 Kiosk", key=f"k{s['id']}"):
+                        st.session_state.kiosk_session = s
+                        st.session_state.page = 'KIOSK'
+                        st.rerun()
                     if c_b.button("Delete", key=f"d{s['id']}"):
-                        sessions.remove(s)
-                        save_sessions(sessions)
+                        get_session_registry().remove(s['id'])
                         st.rerun()
+                    with st.expander("✏️ Edit time"):
+                        start = session_start(s)
+                        c1, c2 = st.columns(2)
+                        e_date = c1.date_input("Date", start.date(), key=f"ed{s['id']}")
+                        e_time = c2.time_input("Start", start.time(), key=f"et{s['id']}")
+                        dur = s.get('duration')
+                        e_dur = st.selectbox("Late Buffer", LATE_BUFFERS, LATE_BUFFERS.index(dur) if dur in LATE_BUFFERS else 0, key=f"eb{s['id']}")
+                        if st.button("Save & re-score", key=f"es{s['id']}"):
+                            try:
+                                updated = get_session_registry().update(s['id'], date=str(e_date), start=str(e_time), duration=e_dur)
+                                # 别的标签页 / 进程已经关掉了这个 session
+                                if updated is None: st.error("Session no longer exists (closed elsewhere).")
+                                else:
+                                    n = get_backend().rescore_session(updated)
+                                    st.success(f"Saved · {n} status(es) changed. Rows already synced to Sheets are not rewritten.")
+                            except ValueError as e: st.error(str(e))
 
         with tab2:
             st.info("Sync local data to Google Sheets after event.")
@@ -347,12 +353,205 @@ with st.sidebar:
                     res = sync_local_to_cloud()
                     st.write(res)
             
-            if os.path.exists(BACKUP_FILE):
-                with open(BACKUP_FILE, "rb") as f:
-                    st.download_button("📥 Download CSV", f, "logs.csv")
+            # 点击时才在后台线程导出
+            st.download_button("📥 Download CSV", get_store().export_csv, "logs.csv", mime="text/csv")
+
+            st.divider()
+            st.markdown("**📑 Reports**")
+            st.caption("Attendance, late list and absentees by Category · built in the background")
+            report_sessions = {s['name']: s for s in get_session_registry().all()}
+            for p in get_backend().closed_partitions(): report_sessions.setdefault(p['Session'], {"id": p['session_id'] or None, "name": p['Session']})
+            for a in get_backend().archive.list(): report_sessions.setdefault(a['session'], {"id": a['session_id'] or None, "name": a['session']})
+            c_s, c_f = st.columns([3, 1])
+            picked = c_s.multiselect("Sessions", list(report_sessions), default=[s['name'] for s in active_sessions if s['name'] in report_sessions])
+            fmt = c_f.radio("Format", ["xlsx", "csv"], format_func=lambda f: {"xlsx": "Excel", "csv": "CSV (zip)"}[f])
+            if st.button("📑 Build report", disabled=not picked):
+                try:
+                    get_backend().start_report([report_sessions[n] for n in picked], fmt)
+                    st.toast("Report started")
+                except ValueError as e: st.error(str(e))
+            reports = get_backend().reports
+            st.fragment(run_every=2 if reports.busy() else None)(report_jobs)()
+
+            st.divider()
+            rp = get_roster_provider()
+            age = rp.age()
+            age_text = f"snapshot age {int(age)}s" if age is not None else "fallback list (no snapshot yet)"
+            st.caption(f"👥 Roster: {len(rp.get())} names · {age_text}")
+            if rp.last_refresh_duration is not None:
+                st.caption(f"Last refresh took {rp.last_refresh_duration:.2f}s")
+            if rp.refreshing: st.caption("🔄 Refreshing in background...")
+            if rp.last_error: st.caption(f"⚠️ Last refresh failed: {rp.last_error}")
+            if st.button("🔄 Refresh Roster"):
+                rp.refresh_async()
+                st.rerun()
+
+            st.divider()
+            st.markdown("**🎫 Badges**")
+            st.caption("Signed QR badges for kiosk scanning (PDF, 8 per A4 page)")
+            badge_roster = rp.get()
+            if st.button(f"Generate badges ({len(badge_roster.names)})"):
+                bar = st.progress(0.0, "Rendering badges...")
+                # 只印 Roster 认得的名字 (空名字 / 重名的后几行跳过), 跟签到时按名字查的结果一致
+                frame = badge_roster.to_frame()
+                frame = frame[frame['Name'].isin(badge_roster.names)].drop_duplicates('Name')
+                with get_perf().stage("badges.bundle"):
+                    st.session_state.badge_bundle = build_badge_bundle(
+                        get_backend().badge_secret, frame,
+                        progress=lambda done, total: bar.progress(done / total, f"Rendering badges... {done}/{total}"))
+                bar.empty()
+            if st.session_state.get('badge_bundle'):
+                st.download_button("📥 Download badges.zip", st.session_state.badge_bundle, "badges.zip", mime="application/zip")
+
+            st.divider()
+            st.markdown("**🗃️ Closed sessions**")
+            backend = get_backend()
+            closed = backend.closed_partitions()
+            force = st.checkbox("Archive even if not synced to Sheets") if closed else False
+            for p in closed:
+                c_a, c_b = st.columns([3, 1])
+                c_a.caption(f"{p['Session']} · {p['rows']} rows · last {p['last']}")
+                if c_b.button("Archive", key=f"ar{p['session_id']}-{p['Session']}"):
+                    try:
+                        n = backend.archive_session(p['session_id'], p['Session'], force=force)
+                        st.toast(f"Archived {n} rows")
+                        st.rerun()
+                    except ValueError as e: st.error(str(e))
+            for a in backend.archive.list():
+                c_a, c_b = st.columns([3, 1])
+                c_a.caption(f"📦 {a['session']} · {a['rows']} rows · {a['bytes'] // 1024} KB")
+                c_b.download_button("CSV", lambda key=a['key']: backend.archive.export_csv(key),
+                                    f"{a['key']}.csv", mime="text/csv", key=f"ax{a['key']}")
+            if not closed and not backend.archive.list(): st.caption("Nothing to archive.")
+
+        with tab3:
+            all_sessions = get_session_registry().all()
+            a_session = st.selectbox("Session", all_sessions, format_func=lambda s: s['name']) if all_sessions else None
+            if a_session:
+                stats = get_stats()
+                with get_perf().stage("analytics.aggregate"):
+                    by_cat, absent = stats.coverage(a_session, get_roster())
+                    summ = stats.summary(a_session)
+                c1, c2, c3 = st.columns(3)
+                c1.metric("Checked-in", summ['total'])
+                c2.metric("On-time", summ['on_time'])
+                late_pct = f"{summ['late'] / summ['total'] * 100:.0f}%" if summ['total'] else None
+                c3.metric("Late", summ['late'], late_pct, delta_color="off")
+                if summ['walk_in']: st.caption(f"Includes {summ['walk_in']} walk-in(s)")
+
+                st.markdown("**Arrivals per minute**")
+                if len(summ['arrivals']): st.bar_chart(summ['arrivals'], x="Minute", y="Arrivals", height=200)
+                else: st.caption("No check-ins yet.")
+
+                st.markdown("**Coverage by Category**")
+                st.dataframe(by_cat, hide_index=True, use_container_width=True)
+                st.markdown(f"**Not yet arrived ({len(absent)})**")
+                st.dataframe(absent, hide_index=True, use_container_width=True, height=250)
+            else:
+                st.caption("No sessions yet.")
+
+        with tab4:
+            perf = get_perf()
+            perf.enabled = st.toggle("⏱️ Record timings", value=perf.enabled)
+            rows = perf.summary()
+            if rows:
+                st.dataframe(rows, hide_index=True, use_container_width=True)
+                c_a, c_b = st.columns(2)
+                c_a.download_button("CSV", perf.to_csv(), "perf.csv", mime="text/csv")
+                c_b.download_button("JSON", perf.to_json(), "perf.json", mime="application/json")
+            else:
+                st.caption("No samples yet.")
+            if st.button("Reset timings"):
+                perf.reset()
+                st.rerun()
 
 # --- 页面路由 ---
 
+def render_live_panel(session_data):
+    """投屏右侧: 没有新签到就直接用上次的结果"""
+    # 本进程的写入看版本号; 别的进程 (checkin_api.py) 写入看库里最大 seq
+    key = session_key(session_data.get('id'), session_data['name'])
+    version = (get_change_notifier().version(key), get_store().max_seq())
+    cache_key = f"live_{key}"
+    cached = st.session_state.get(cache_key)
+    if cached is None or cached[0] != version:
+        tailer = get_log_tailer()
+        with get_perf().stage("projection.poll"):
+            tailer.poll()
+        count, recent_rows = tailer.snapshot(session_data)
+        st.session_state[cache_key] = (version, count, recent_rows)
+    else:
+        _, count, recent_rows = cached
+
+    # 总数卡片
+    st.markdown(f"""
+    <div style="background: linear-gradient(135deg, #1e3a8a 0%, #1e40af 100%); color: white; padding: 30px; border-radius: 30px; text-align: center; margin-bottom: 20px; box-shadow: 0 10px 20px rgba(30, 58, 138, 0.3);">
+        <div style="font-size: 16px; opacity: 0.8; letter-spacing: 2px;">TOTAL CHECKED-IN</div>
+        <div style="font-size: 72px; font-weight: 800;">{count}</div>
+    </div>
+    """, unsafe_allow_html=True)
+
+    # 滚动列表
+    st.markdown("### 🟢 Recent Activity")
+    if recent_rows:
+        for row in recent_rows:
+            masked_name = mask_name_smart(row['Name'])
+            time_only = row['Timestamp'].split(' ')[-1][:5]
+            st.markdown(f"""
+            <div class="feed-item">
+                <span style="font-weight: 600; color: #334155; font-size: 18px;">{masked_name}</span>
+                <span style="font-family: monospace; color: #94a3b8;">{time_only}</span>
+            </div>
+            """, unsafe_allow_html=True)
+    else:
+        st.info("Waiting for check-ins...")
+
+def timed_live_panel(session_data):
+    with get_perf().stage("projection.panel"):
+        render_live_panel(session_data)
+
+def render_command_center():
+    """所有进行中的 session: 一次增量 poll 更新全部计数, 没有新签到就直接用上次的结果"""
+    sessions = get_session_registry().active()
+    keys = tuple((s.get('id'), s['name']) for s in sessions)   # 按分区; 改名也要重画卡片
+    # "最近 N 分钟" 随时间变, 没有新签到也要每分钟重算一次
+    since = (kl_now() - timedelta(minutes=COMMAND_RECENT_MINUTES)).strftime("%Y-%m-%d %H:%M")
+    version = (get_change_notifier().version(), get_store().max_seq(), keys, since)
+    cached = st.session_state.get('command_center')
+    if cached is None or cached[0] != version:
+        with get_perf().stage("command.poll"):
+            cards = get_stats().overview(sessions, since=since)
+        st.session_state.command_center = (version, cards)
+    else:
+        _, cards = cached
+    if not cards:
+        st.info("No active sessions.")
+        return
+
+    total, late = sum(c['total'] for c in cards), sum(c['late'] for c in cards)
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Rooms", len(cards))
+    c2.metric("Checked-in", total)
+    c3.metric("Late", late, f"{late / total * 100:.0f}%" if total else None, delta_color="off")
+
+    for i in range(0, len(cards), 3):
+        for col, c in zip(st.columns(3), cards[i:i + 3]):
+            with col, st.container(border=True):
+                st.markdown(f"""
+                <div style="text-align: center;">
+                    <div style="font-size: 18px; font-weight: 700; color: #1e293b;">{c['session']}</div>
+                    <div style="font-size: 56px; font-weight: 800; color: #1e40af;">{c['total']}</div>
+                    <div style="color: #64748b;">🟢 {c['on_time']} on-time · 🟡 {c['late']} late ({c['late_pct']}%)</div>
+                    <div style="color: #94a3b8; font-size: 13px;">{c['recent_count']} in last {COMMAND_RECENT_MINUTES} min · {c['walk_in']} walk-in</div>
+                </div>
+                """, unsafe_allow_html=True)
+                for name, ts in c['recent']:
+                    st.markdown(f"<div class='feed-item'><span>{mask_name_smart(name)}</span><span style='font-family: monospace; color:#94a3b8;'>{ts.split(' ')[-1][:5]}</span></div>", unsafe_allow_html=True)
+
+def timed_command_center():
+    with get_perf().stage("command.panel"):
+        render_command_center()
+
 # A. 投屏页面 (Project Screen - 全新设计)
 if st.session_state.page == 'PROJECTION':
     s = st.session_state.get('project_session')
@@ -381,15 +580,14 @@ if st.session_state.page == 'PROJECTION':
             """, unsafe_allow_html=True)
             
             # Logo
-            if os.path.exists(LOGO_FILE):
-                st.image(LOGO_FILE, width=120)
+            logo = get_asset_cache().file_bytes(LOGO_FILE)
+            if logo:
+                st.image(logo, width=120)
             
             # QR Code
             st.markdown("### 1. SCAN QR")
-            qr = qrcode.make(APP_URL)
-            img = io.BytesIO()
-            qr.save(img, format='PNG')
-            st.image(img, width=280)
+            qr_target = session_link(s) if QR_DEEP_LINK else APP_URL
+            st.image(get_asset_cache().qr_png(qr_target), width=280)
             
             st.markdown("---")
             
@@ -401,46 +599,57 @@ if st.session_state.page == 'PROJECTION':
             st.markdown("</div>", unsafe_allow_html=True)
 
         with col_R:
-            # 右侧：实时数据区
-            logs = get_logs_data()
-            session_logs = logs[logs['Session'] == s['name']] if not logs.empty and 'Session' in logs.columns else pd.DataFrame()
-            count = len(session_logs)
-            
-            # 总数卡片
-            st.markdown(f"""
-            <div style="background: linear-gradient(135deg, #1e3a8a 0%, #1e40af 100%); color: white; padding: 30px; border-radius: 30px; text-align: center; margin-bottom: 20px; box-shadow: 0 10px 20px rgba(30, 58, 138, 0.3);">
-                <div style="font-size: 16px; opacity: 0.8; letter-spacing: 2px;">TOTAL CHECKED-IN</div>
-                <div style="font-size: 72px; font-weight: 800;">{count}</div>
-            </div>
-            """, unsafe_allow_html=True)
+            # 右侧：实时数据区 (只有这块定时局部刷新)
+            st.fragment(run_every=st.session_state.projection_refresh)(timed_live_panel)(s)
 
-            # 滚动列表
-            st.markdown("### 🟢 Recent Activity")
-            if not session_logs.empty:
-                display_logs = session_logs.sort_values("Timestamp", ascending=False).head(8)
-                for _, row in display_logs.iterrows():
-                    masked_name = mask_name_smart(row['Name'])
-                    time_only = row['Timestamp'].split(' ')[1][:5]
-                    st.markdown(f"""
-                    <div class="feed-item">
-                        <span style="font-weight: 600; color: #334155; font-size: 18px;">{masked_name}</span>
-                        <span style="font-family: monospace; color: #94a3b8;">{time_only}</span>
-                    </div>
-                    """, unsafe_allow_html=True)
-            else:
-                st.info("Waiting for check-ins...")
+# A1. 指挥中心 (所有进行中的 session 一屏看)
+elif st.session_state.page == 'COMMAND':
+    if st.button("⬅️ Exit"):
+        st.session_state.page = 'HOME'
+        st.rerun()
+    st.markdown('<h1 style="color: #1e293b; margin: 0;">🛰️ Command Center</h1>', unsafe_allow_html=True)
+    st.fragment(run_every=st.session_state.projection_refresh)(timed_command_center)()
 
-        time.sleep(5)
+# A2. 门口扫码 kiosk (扫码枪当键盘用: 扫完自动回车)
+elif st.session_state.page == 'KIOSK':
+    s = st.session_state.get('kiosk_session')
+    if st.button("⬅️ Exit"):
+        st.session_state.page = 'HOME'
         st.rerun()
 
+    if s:
+        def on_scan():
+            token = st.session_state.kiosk_scan
+            st.session_state.kiosk_scan = ""
+            if token.strip(): st.session_state.kiosk_last = get_backend().scan_badge(s, token)
+
+        st.markdown(f"<h1 style='text-align:center; color:#1e293b;'>{s['name']}</h1>", unsafe_allow_html=True)
+        st.text_input("Scan badge", key="kiosk_scan", on_change=on_scan, placeholder="Scan badge QR...")
+        last = st.session_state.get('kiosk_last')
+        if last:
+            ok, text = last
+            bg, fg = ("#dcfce7", "#166534") if ok else ("#fee2e2", "#991b1b")
+            label = f"✅ Welcome, {text}!" if ok else f"❌ {text}"
+            st.markdown(f"<div style='background:{bg}; color:{fg}; padding:40px; border-radius:30px; text-align:center; font-size:40px; font-weight:800;'>{label}</div>", unsafe_allow_html=True)
+
+        def kiosk_recent():
+            kq = get_backend().kiosk_queue
+            if kq.last_error: st.error(kq.last_error)
+            for r in kq.recent()[:8]:
+                mark, detail = {True: ("🟢", r['status']), False: ("🟡", f"already at {r['status']}")}.get(r['ok'], ("🔴", r['status']))
+                st.markdown(f"<div class='feed-item'><span>{mark} {mask_name_smart(r['Name'])}</span><span style='color:#94a3b8;'>{detail}</span></div>", unsafe_allow_html=True)
+        st.markdown("### Recent scans")
+        st.fragment(run_every=1)(kiosk_recent)()
+
 # B. 手机端 (Home - 极简金融风)
 elif st.session_state.page == 'HOME':
     st.markdown('<div class="mobile-wrapper">', unsafe_allow_html=True)
     
     # 顶部 Logo
-    if os.path.exists(LOGO_FILE):
+    logo = get_asset_cache().file_bytes(LOGO_FILE)
+    if logo:
         c1, c2, c3 = st.columns([1, 2, 1])
-        with c2: st.image(LOGO_FILE, use_container_width=True)
+        with c2: st.image(logo, use_container_width=True)
     
     st.markdown('<div class="app-title">DFMA Check-in</div>', unsafe_allow_html=True)
     st.markdown('<div class="app-subtitle">Secure Attendance System</div>', unsafe_allow_html=True)
@@ -449,19 +658,30 @@ elif st.session_state.page == 'HOME':
     st.markdown("<label style='font-size: 12px; color: #64748b; font-weight: 700; letter-spacing: 1px; display:block; margin-bottom:8px; text-align:center;'>ENTER 6-DIGIT CODE</label>", unsafe_allow_html=True)
     
     st.markdown('<div class="code-input">', unsafe_allow_html=True)
-    code = st.text_input("code", label_visibility="collapsed", max_chars=6, placeholder="______").strip()
+    # 扫投屏上的深链接进来: 自动填好签到码
+    if 'code_input' not in st.session_state:
+        st.session_state.code_input = st.query_params.get("code", "")[:6]
+    code = st.text_input("code", key="code_input", label_visibility="collapsed", max_chars=6, placeholder="______").strip()
     st.markdown('</div>', unsafe_allow_html=True)
     
-    target_session = next((s for s in active_sessions if s['code'] == code), None)
+    target_session = get_session_registry().by_code(code) if code else None
     
     if target_session:
         st.success(f"📍 {target_session['name']}")
         
         # 2. 搜索名字
-        df_participants = get_participants_data()
-        all_names = sorted(df_participants['Name'].unique().tolist()) if not df_participants.empty else []
+        with get_perf().stage("home.roster_get"):
+            roster = get_roster()
         
-        search_query = st.selectbox("Select Name", [""] + all_names, placeholder="Type to search...", index=0)
+        if SERVER_SIDE_SEARCH:
+            # 不管名单多大, 每次只发 top-k 个名字给浏览器
+            typed = st.text_input("Search Name", placeholder="Type at least 2 letters of your name...").strip()
+            with get_perf().stage("home.name_search"):
+                matches = roster.search(typed, NAME_SEARCH_TOP_K) if len(typed) >= 2 else []
+            if len(typed) >= 2 and not matches: st.caption("No match. Check spelling or register as walk-in below.")
+            search_query = st.radio("Select Name", matches, index=None, label_visibility="collapsed") if matches else None
+        else:
+            search_query = st.selectbox("Select Name", ("",) + roster.names, placeholder="Type to search...", index=0)
         
         if search_query:
             st.markdown("---")
@@ -471,17 +691,20 @@ elif st.session_state.page == 'HOME':
             
             if st.button("Check In Now"):
                 try:
-                    user_row = df_participants[df_participants['Name'] == search_query].iloc[0]
-                    # 清洗数据
-                    real_ic = str(user_row.get('IC', '0000')).replace('.0', '').strip()
-                    
-                    if len(ic_input) == 4 and real_ic.endswith(ic_input):
+                    with get_perf().stage("home.name_lookup"):
+                        user_row = roster.by_name(search_query)
+                    if user_row is None: raise KeyError(search_query)
+                    if verify_ic(user_row, ic_input):
                         cat = user_row.get('Category', 'Unknown')
                         email = user_row.get('Email', '-')
-                        success, status = write_log(target_session, search_query, cat, email=email)
-                        st.session_state.current_user = {"name": search_query, "status": status, "session": target_session['name']}
-                        st.session_state.page = 'SUCCESS'
-                        st.rerun()
+                        with get_perf().stage("home.write_log"):
+                            success, status = write_log(target_session, search_query, cat, email=email)
+                        if not success:
+                            st.warning(f"✅ Already checked in at {status}")
+                        else:
+                            st.session_state.current_user = {"name": search_query, "status": status, "session": target_session['name']}
+                            st.session_state.page = 'SUCCESS'
+                            st.rerun()
                     else:
                         st.error("❌ IC Verification Failed")
                 except Exception as e:
@@ -496,9 +719,12 @@ elif st.session_state.page == 'HOME':
             if st.button("Register Walk-in"):
                 if wi_name and wi_email:
                     success, status = write_log(target_session, wi_name, "Walk-in", wi_email, wi_phone)
-                    st.session_state.current_user = {"name": wi_name, "status": status, "session": target_session['name']}
-                    st.session_state.page = 'SUCCESS'
-                    st.rerun()
+                    if not success:
+                        st.warning(f"✅ {wi_email} already checked in at {status}")
+                    else:
+                        st.session_state.current_user = {"name": wi_name, "status": status, "session": target_session['name']}
+                        st.session_state.page = 'SUCCESS'
+                        st.rerun()
                 else:
                     st.error("Missing fields")
     
@@ -539,3 +765,11 @@ elif st.session_state.page == 'SUCCESS':
         st.rerun()
         
     st.markdown('</div>', unsafe_allow_html=True)
+
+# 完整跑完的 rerun (st.rerun() 中途跳出的不算)
+perf = get_perf()
+if perf.enabled:
+    first_run = not st.session_state.get('_perf_seen')
+    st.session_state._perf_seen = True
+    perf.record("startup.first_run" if first_run else f"rerun.{st.session_state.page.lower()}",
+                time.perf_counter() - _rerun_t0)
@@ -0,0 +1,79 @@
+import glob
+import os
+import re
+import tempfile
+
+import pandas as pd
+
+# ==========================================
+# 🗃️ 已结束 session 的归档 (每个 session 一个 zstd Parquet)
+# ==========================================
+# pyarrow 只在归档 / 读归档时才 import
+
+def archive_key(session_id, session_name):
+    """文件名用 session id; 没有 id 的旧数据用 session 名"""
+    if session_id: return f"id-{session_id}"
+    return "name-" + (re.sub(r'[^A-Za-z0-9_-]+', '_', str(session_name)).strip('_') or "unnamed")
+
+
+class LogArchive:
+    def __init__(self, folder, columns):
+        self.folder = folder
+        self.columns = list(columns)
+
+    def _path(self, key):
+        return os.path.join(self.folder, f"{key}.parquet")
+
+    def write(self, key, df, session_name, session_id=None):
+        """写入 (已有同名归档就合并, 按 ID 去重); 临时文件 + rename, 不会留下半个文件"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        df = df[['_seq'] + self.columns].astype({c: str for c in self.columns})
+        path = self._path(key)
+        if os.path.exists(path):
+            df = pd.concat([pq.read_table(path).to_pandas(), df], ignore_index=True)
+            df = df.drop_duplicates(subset=['ID']).sort_values('_seq', ignore_index=True)
+        table = pa.Table.from_pandas(df, preserve_index=False).replace_schema_metadata({
+            "session": str(session_name), "session_id": str(session_id or '')})
+        os.makedirs(self.folder, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".archive-", suffix=".tmp", dir=self.folder)
+        os.close(fd)
+        try:
+            pq.write_table(table, tmp, compression="zstd")
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp): os.remove(tmp)
+            raise
+        return len(df)
+
+    def list(self):
+        """[{key, session, session_id, rows, bytes}] (只读 footer, 不读数据)"""
+        paths = sorted(glob.glob(os.path.join(self.folder, "*.parquet")))
+        if not paths: return []
+        import pyarrow.parquet as pq
+        out = []
+        for path in paths:
+            meta = pq.read_metadata(path)
+            kv = {k.decode(): v.decode() for k, v in (meta.metadata or {}).items()}
+            out.append({"key": os.path.basename(path)[:-len(".parquet")], "session": kv.get("session", ""),
+                        "session_id": kv.get("session_id", ""), "rows": meta.num_rows,
+                        "bytes": os.path.getsize(path)})
+        return out
+
+    def read(self, key, columns=None, filters=None):
+        """读一个归档; columns / filters 直接交给 Parquet (只读需要的列和行组)"""
+        import pyarrow.parquet as pq
+        path = self._path(key)
+        if not os.path.exists(path): return pd.DataFrame(columns=columns or self.columns)
+        return pq.read_table(path, columns=columns, filters=filters).to_pandas()
+
+    def iter_chunks(self, key, chunk=5000):
+        """按行组分批读 (tuple, 按 columns 顺序), 内存只占一批"""
+        path = self._path(key)
+        if not os.path.exists(path): return
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk, columns=self.columns):
+            yield list(zip(*(col.to_pylist() for col in batch.columns)))
+
+    def export_csv(self, key):
+        return self.read(key, columns=self.columns).to_csv(index=False).encode('utf-8')
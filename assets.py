@@ -0,0 +1,59 @@
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+# ==========================================
+# 🖼️ 图片缓存 (QR / Logo 只生成一次)
+# ==========================================
+
+@lru_cache(maxsize=8)
+def minify_css(css):
+    """去注释 + 压空白; 每次 rerun 都要重发 <style>, 发小一点 (进程内只算一次)"""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    return re.sub(r':\s+', ':', css).strip()   # ' :hover' 前面的空格有意义, 不动
+
+
+class AssetCache:
+    """按 key 缓存 PNG bytes, 超过 maxsize 淘汰最久没用的"""
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+        data = build()
+        with self._lock:
+            self._items[key] = data
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return data
+
+    def qr_png(self, text):
+        def build():
+            import qrcode   # 只有投屏页要用, 不拖慢冷启动
+            buf = io.BytesIO()
+            qrcode.make(text).save(buf, format='PNG')
+            return buf.getvalue()
+        return self.get_or_build(('qr', text), build)
+
+    def file_bytes(self, path):
+        """文件改了 (mtime 变) 会自动重新读; 文件不存在返回 None"""
+        try: mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError: return None
+        def build():
+            with open(path, 'rb') as f: return f.read()
+        return self.get_or_build(('file', path, mtime), build)
+
+    def __len__(self):
+        return len(self._items)
@@ -0,0 +1,72 @@
+import threading
+import time
+
+from roster import normalize_email
+
+# ==========================================
+# ✅ 已签到名单 (重复签到 O(1) 拒绝)
+# ==========================================
+
+def attendee_key(name, user_type, email):
+    """名单上的人按名单里的原名 (跟 Roster 一样, 原名就是身份, 'Chloe Ng' 和 'Chloé Ng' 是两个人);
+    Walk-in 按规范化的 email (没填 email 才退回名字)"""
+    if user_type == "Walk-in":
+        email = normalize_email(email)
+        if email: return "email:" + email
+    return "member:" + str(name)
+
+
+def session_key(session_id, session_name):
+    return f"id:{session_id}" if session_id else f"name:{session_name}"
+
+
+class AttendanceIndex:
+    """{(session, 参加者): 第一次签到时间}; 启动时从库里重建, 之后按 seq 增量跟上 (别的进程写的也算)"""
+
+    def __init__(self, store, catch_up_interval=0.5):
+        self.store = store
+        self.catch_up_interval = catch_up_interval
+        self._lock = threading.Lock()
+        self._catch_up_lock = threading.Lock()
+        self._seen = {}
+        self._last_seq = 0
+        self._last_catch_up = 0.0
+        self.catch_up(force=True)
+
+    def catch_up(self, force=False):
+        """读上次之后新写入的行; 本进程的写入已经占过位, 这里主要是别的进程 (checkin_api.py) 的,
+        所以最多每 catch_up_interval 秒读一次, 同一时间只有一个线程读"""
+        if not force and time.monotonic() - self._last_catch_up < self.catch_up_interval: return
+        with self._catch_up_lock:
+            if not force and time.monotonic() - self._last_catch_up < self.catch_up_interval: return
+            rows = self.store.rows_after(self._last_seq)
+            with self._lock:
+                if not rows and self.store.max_seq() < self._last_seq:
+                    self._seen.clear()
+                    self._last_seq = 0
+                    rows = self.store.rows_after(0)
+                for row in rows:
+                    key = (session_key(row.get('session_id'), row['Session']),
+                           attendee_key(row['Name'], row['Type'], row['Email']))
+                    self._seen.setdefault(key, row['Timestamp'])
+                if rows: self._last_seq = max(self._last_seq, rows[-1]['_seq'])
+            self._last_catch_up = time.monotonic()
+
+    def first_checkin(self, session_data, name, user_type, email):
+        """纯内存查找, 不碰库; 没签过返回 None"""
+        key = (session_key(session_data.get('id'), session_data['name']), attendee_key(name, user_type, email))
+        return self._seen.get(key)
+
+    def reserve(self, session_data, name, user_type, email, timestamp):
+        """原子地占位: 成功返回 None, 已经签过返回第一次的时间"""
+        key = (session_key(session_data.get('id'), session_data['name']), attendee_key(name, user_type, email))
+        with self._lock:
+            first = self._seen.get(key)
+            if first is None: self._seen[key] = timestamp
+            return first
+
+    def release(self, session_data, name, user_type, email, timestamp):
+        """写库失败时撤销占位"""
+        key = (session_key(session_data.get('id'), session_data['name']), attendee_key(name, user_type, email))
+        with self._lock:
+            if self._seen.get(key) == timestamp: del self._seen[key]
@@ -0,0 +1,129 @@
+import base64
+import hashlib
+import hmac
+import io
+import os
+import secrets
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+# ==========================================
+# 🎫 参加者胸牌 (HMAC 签名的 QR, kiosk 本地验证)
+# ==========================================
+# 验签只用 hmac; qrcode / PIL / numpy 只在打印时 (子进程里) 才 import
+
+TOKEN_PREFIX = "DF1"
+SIG_BYTES = 12          # 96-bit 截断 HMAC-SHA256, QR 不会太密
+_SEP = "\x1f"
+
+# A4 @ 150dpi, 每页 2 x 4 张
+PAGE_SIZE = (1240, 1754)
+GRID = (2, 4)
+PAGES_PER_PDF = 50
+BADGE_QR_MASK = 2
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def load_secret(path, env_value=None):
+    """环境变量 / st.secrets 优先; 都没有就用 data_dir 里的 key 文件 (第一次自动生成)"""
+    if env_value: return env_value.encode('utf-8')
+    if os.path.exists(path):
+        with open(path, 'rb') as f: return f.read().strip()
+    key = secrets.token_hex(32).encode('ascii')
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'wb') as f: f.write(key)
+    return key
+
+
+def sign_badge(secret, name, category="-", email="-"):
+    """DF1.<base64 name␟category␟email>.<base64 sig>"""
+    body = _b64(_SEP.join((str(name), str(category), str(email))).encode('utf-8'))
+    sig = hmac.new(secret, f"{TOKEN_PREFIX}.{body}".encode('ascii'), hashlib.sha256).digest()[:SIG_BYTES]
+    return f"{TOKEN_PREFIX}.{body}.{_b64(sig)}"
+
+
+def verify_badge(secret, token):
+    """验签通过返回 {"Name", "Category", "Email"}; 否则 None (不查名单)"""
+    try:
+        prefix, body, sig = str(token).strip().split('.')
+        if prefix != TOKEN_PREFIX: return None
+        expected = hmac.new(secret, f"{prefix}.{body}".encode('ascii'), hashlib.sha256).digest()[:SIG_BYTES]
+        if not hmac.compare_digest(expected, _unb64(sig)): return None
+        name, category, email = _unb64(body).decode('utf-8').split(_SEP)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return {"Name": name, "Category": category, "Email": email}
+
+
+# --- 打印 ---
+def qr_image(text, size):
+    """直接用 QR 矩阵生成灰度图, 比 qrcode.make 的逐格绘制快;
+    固定 mask (不试 8 种挑最优) 省掉大部分时间, 扫码不受影响"""
+    import numpy as np
+    import qrcode
+    from PIL import Image
+    qr = qrcode.QRCode(border=2, error_correction=qrcode.constants.ERROR_CORRECT_M, mask_pattern=BADGE_QR_MASK)
+    qr.add_data(text)
+    qr.make(fit=True)
+    matrix = np.array(qr.get_matrix(), dtype=bool)
+    img = Image.fromarray(np.where(matrix, 0, 255).astype(np.uint8), mode='L')
+    return img.resize((size, size), Image.NEAREST)
+
+
+def _font(size):
+    from PIL import ImageFont
+    try: return ImageFont.load_default(size=size)
+    except TypeError: return ImageFont.load_default()
+
+
+def _render_page(badges, fonts):
+    from PIL import Image, ImageDraw
+    page = Image.new('L', PAGE_SIZE, 255)
+    draw = ImageDraw.Draw(page)
+    cols, rows = GRID
+    cell_w, cell_h = PAGE_SIZE[0] // cols, PAGE_SIZE[1] // rows
+    qr_size = int(cell_h * 0.62)
+    for i, (token, name, category) in enumerate(badges):
+        x, y = (i % cols) * cell_w, (i // cols) * cell_h
+        draw.rectangle([x + 10, y + 10, x + cell_w - 10, y + cell_h - 10], outline=180, width=2)
+        page.paste(qr_image(token, qr_size), (x + (cell_w - qr_size) // 2, y + 24))
+        draw.text((x + cell_w // 2, y + qr_size + 44), str(name)[:32], fill=0, font=fonts[0], anchor="mt")
+        draw.text((x + cell_w // 2, y + qr_size + 90), str(category), fill=90, font=fonts[1], anchor="mt")
+    return page.convert('1', dither=Image.Dither.NONE)
+
+
+def render_pdf(badges):
+    """一组 (token, name, category) -> 一个 PDF (bytes); 在子进程里跑"""
+    fonts = (_font(34), _font(24))
+    per_page = GRID[0] * GRID[1]
+    pages = [_render_page(badges[i:i + per_page], fonts) for i in range(0, len(badges), per_page)]
+    buf = io.BytesIO()
+    pages[0].save(buf, format='PDF', save_all=True, append_images=pages[1:], resolution=150)
+    return buf.getvalue()
+
+
+def build_badge_bundle(secret, roster_frame, workers=None, progress=None):
+    """名单 -> badges.zip (每 400 人一个 PDF, 多进程并行); progress(done, total) 可选"""
+    names = roster_frame['Name'].astype(str)
+    cats = roster_frame['Category'].astype(str) if 'Category' in roster_frame.columns else ['-'] * len(names)
+    emails = roster_frame['Email'].astype(str) if 'Email' in roster_frame.columns else ['-'] * len(names)
+    badges = [(sign_badge(secret, n, c, e), n, c) for n, c, e in zip(names, cats, emails)]
+    chunk = PAGES_PER_PDF * GRID[0] * GRID[1]
+    chunks = [badges[i:i + chunk] for i in range(0, len(badges), chunk)]
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', compression=zipfile.ZIP_STORED) as zf:
+        if chunks:
+            with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+                for i, pdf in enumerate(pool.map(render_pdf, chunks)):
+                    first = i * chunk + 1
+                    zf.writestr(f"badges_{first:05d}-{first + len(chunks[i]) - 1:05d}.pdf", pdf)
+                    if progress: progress(i + 1, len(chunks))
+    return buf.getvalue()
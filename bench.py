@@ -0,0 +1,325 @@
+"""压测签到流程 (不需要 Google 账号)
+
+    python bench.py                                  # 默认: 两种模式 x 1k/10k/100k
+    python bench.py --attendees 100 --latency 0.3 --sizes 1000 50000 --out result.json
+    python bench.py --compare result.json            # 跟上次结果比较, 变慢 >20% 会标出来
+    python bench.py --api --sizes 10000              # 另外压 checkin_api.py 的 HTTP 签到吞吐量
+    python bench.py --startup --sizes                # 只测 app.py 冷启动 / rerun 耗时和 import 大头
+
+每个 (模式, 名单/日志规模) 组合在临时目录里跑一遍, 后端用 fake_gsheets 模拟 Sheets 延迟。
+结果是 JSON: 每个操作的吞吐量和 p50/p95/p99 延迟 (毫秒)。
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import pandas as pd
+
+from badges import sign_badge
+from checkin_api import CheckinAPI
+from core import Backend, LOG_COLUMNS, kl_now, verify_ic
+from fake_gsheets import FakeGSheetsConnection
+
+SESSION = {"id": 1, "name": "Bench Session", "code": "123456", "active": True, "duration": "15m"}
+
+
+class Timings:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.walls = {}
+
+    def record(self, op, seconds):
+        with self._lock: self.samples.setdefault(op, []).append(seconds)
+
+    def timed(self, op, fn, *args, **kwargs):
+        t0 = time.perf_counter()
+        try: return fn(*args, **kwargs)
+        finally: self.record(op, time.perf_counter() - t0)
+
+    def summary(self):
+        out = {}
+        for op, xs in self.samples.items():
+            xs = sorted(xs)
+            pct = lambda p: xs[min(len(xs) - 1, int(round(p / 100 * (len(xs) - 1))))] * 1000
+            wall = self.walls.get(op, sum(xs))
+            out[op] = {
+                "count": len(xs),
+                "throughput_per_s": round(len(xs) / wall, 2) if wall else None,
+                "p50_ms": round(pct(50), 3),
+                "p95_ms": round(pct(95), 3),
+                "p99_ms": round(pct(99), 3),
+                "max_ms": round(xs[-1] * 1000, 3),
+            }
+        return out
+
+
+def make_roster(n):
+    return pd.DataFrame({
+        "Name": [f"Participant {i:06d}" for i in range(n)],
+        "Email": [f"p{i}@example.com" for i in range(n)],
+        "Category": [random.choice(["Member", "Guest", "Staff"]) for _ in range(n)],
+        "IC": [f"{900000000000 + i}" for i in range(n)],
+    })
+
+
+def make_logs(n):
+    ts = kl_now().strftime("%Y-%m-%d %H:%M:%S")
+    return [{"Timestamp": ts, "Session": f"Old Session {i % 20}", "Name": f"Participant {i:06d}",
+             "Type": "Member", "Status": "On-time", "Email": "-", "Phone": "-", "ID": uuid.uuid4().hex}
+            for i in range(n)]
+
+
+def run_case(mode, roster_size, log_size, attendees, checkins, latency):
+    high_traffic = mode == "high_traffic"
+    roster = make_roster(roster_size)
+    old_logs = make_logs(log_size)
+    conn = FakeGSheetsConnection(
+        {"Participants": roster, "Logs": pd.DataFrame(old_logs, columns=LOG_COLUMNS)}, latency=latency)
+    t = Timings()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        start = kl_now() - timedelta(minutes=5)
+        session = dict(SESSION, date=start.strftime("%Y-%m-%d"), start=start.strftime("%H:%M:%S"))
+        with open(os.path.join(data_dir, "sessions.json"), "w") as f: json.dump([session], f)
+
+        backend = Backend(conn, data_dir=data_dir, cloud_flush_interval=0.5, cloud_flush_size=200)
+        for i in range(0, len(old_logs), 5000):
+            backend.store.append_many(old_logs[i:i + 5000])
+        backend.attendance.catch_up(force=True)   # 相当于启动时从库里重建已签到名单
+        # 建立同步水位线, 之后的 sync 只算增量
+        backend.ledger.state = {"synced_seq": backend.store.max_seq(),
+                                "last_id": old_logs[-1]["ID"] if old_logs else None, "pushed_ranges": []}
+
+        for _ in range(3): t.timed("get_participants_data", backend.get_participants_data)
+        t.timed("roster_cold_build", backend.get_roster)
+        for _ in range(3): t.timed("get_logs_data", backend.get_logs_data)
+
+        def attendee(k):
+            for j in range(checkins):
+                t0 = time.perf_counter()
+                r = backend.get_roster()
+                # 每人签一次 (名单比签到次数少时才会有重复)
+                name = r.names[(k * checkins + j) % len(r.names)]
+                t.timed("name_search", r.search, name.split()[-1])
+                row = r.by_name(name)
+                if not verify_ic(row, row["IC"][-4:]): raise AssertionError(f"IC check failed: {name}")
+                t.timed("calculate_status", backend.calculate_status, session)
+                t.timed("write_log", backend.write_log, session, name, row["Category"],
+                        email=row["Email"], high_traffic=high_traffic)
+                t.record("checkin_total", time.perf_counter() - t0)
+            # 重复签到: 内存里直接拒绝
+            ok, _ = t.timed("write_log_duplicate", backend.write_log, session, name, row["Category"],
+                            email=row["Email"], high_traffic=high_traffic)
+            if ok: raise AssertionError(f"duplicate accepted: {name}")
+
+        wall0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=attendees) as pool:
+            list(pool.map(attendee, range(attendees)))
+        wall = time.perf_counter() - wall0
+        for op in ("checkin_total", "write_log", "calculate_status", "name_search"):
+            t.walls[op] = wall
+
+        # kiosk 扫胸牌: 验签 + 入队 (名单里还没签到的人)
+        r = backend.get_roster()
+        unused = r.names[attendees * checkins:attendees * checkins + 200]
+        tokens = [sign_badge(backend.badge_secret, n, r.by_name(n)["Category"], r.by_name(n)["Email"]) for n in unused]
+        for tok in tokens: t.timed("kiosk_scan", backend.scan_badge, session, tok)
+        deadline = time.time() + 10
+        while backend.kiosk_queue.pending_count() and time.time() < deadline: time.sleep(0.05)
+
+        # 投屏 tailer: 第一次全量, 之后增量
+        t.timed("tailer_poll_cold", backend.tailer.poll)
+        t.timed("tailer_poll_warm", backend.tailer.poll)
+
+        if not high_traffic:
+            t.timed("cloud_queue_drain", backend.cloud_queue.flush)
+        t.timed("sync_local_to_cloud", backend.sync_local_to_cloud)
+        t.timed("sync_local_to_cloud_noop", backend.sync_local_to_cloud)
+        if backend._cloud_queue is not None: backend._cloud_queue.stop(flush=False)
+
+    return {
+        "mode": mode, "roster_size": roster_size, "log_size": log_size,
+        "attendees": attendees, "checkins_per_attendee": checkins, "latency_s": latency,
+        "wall_s": round(wall, 3), "sheets_calls": dict(conn.calls), "ops": t.summary(),
+    }
+
+
+def run_api_case(roster_size, attendees, checkins):
+    """checkin_api.py 的 HTTP 签到: 每个 attendee 一条 keep-alive 连接, search + checkin"""
+    roster = make_roster(roster_size)
+    t = Timings()
+    with tempfile.TemporaryDirectory() as data_dir:
+        start = kl_now() - timedelta(minutes=5)
+        session = dict(SESSION, date=start.strftime("%Y-%m-%d"), start=start.strftime("%H:%M:%S"))
+        with open(os.path.join(data_dir, "sessions.json"), "w") as f: json.dump([session], f)
+        roster.to_csv(os.path.join(data_dir, "local_namelist.csv"), index=False)
+
+        api = CheckinAPI(Backend(None, data_dir=data_dir))
+        names = api.backend.get_roster().names
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, daemon=True).start()
+        ready, port = threading.Event(), []
+        serving = asyncio.run_coroutine_threadsafe(
+            api.serve("127.0.0.1", 0, ready=lambda p: (port.append(p), ready.set())), loop)
+        ready.wait()
+
+        def attendee(k):
+            c = http.client.HTTPConnection("127.0.0.1", port[0])
+            for j in range(checkins):
+                name = names[(k * checkins + j) % len(names)]
+                t0 = time.perf_counter()
+                c.request("GET", f"/api/search?code={session['code']}&q={name.split()[-1]}")
+                c.getresponse().read()
+                ic = roster.loc[int(name.split()[-1]), "IC"][-4:]
+                c.request("POST", "/api/checkin", json.dumps({"code": session["code"], "name": name, "ic": ic}))
+                resp = c.getresponse()
+                body = resp.read()
+                if resp.status not in (200, 409): raise AssertionError(f"check-in failed: {body!r}")
+                t.record("api_checkin_total", time.perf_counter() - t0)
+            c.close()
+
+        wall0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=attendees) as pool:
+            list(pool.map(attendee, range(attendees)))
+        wall = time.perf_counter() - wall0
+        t.walls["api_checkin_total"] = wall
+        # 客户端都已断开: 关掉监听, 等 handler 自己结束 (不取消, 免得打出 CancelledError)
+        loop.call_soon_threadsafe(api.stop)
+        serving.result()
+        loop.call_soon_threadsafe(loop.stop)
+
+    return {
+        "mode": "api", "roster_size": roster_size, "log_size": 0,
+        "attendees": attendees, "checkins_per_attendee": checkins, "latency_s": 0,
+        "wall_s": round(wall, 3), "write_batches": api.writer.batches, "ops": t.summary(),
+    }
+
+
+STARTUP_SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=60)
+t1 = time.perf_counter()
+at.run()
+first = time.perf_counter() - t1
+reruns = []
+for _ in range(int(sys.argv[2])):
+    t = time.perf_counter()
+    at.run()
+    reruns.append(time.perf_counter() - t)
+print(json.dumps({"apptest_import_s": t1 - t0, "first_run_s": first, "reruns_s": reruns,
+                  "error": [str(e.value) for e in at.exception]}))
+"""
+
+
+def import_breakdown(modules, top=10):
+    """python -X importtime: 每个模块的 self 时间按顶层包汇总 (ms)"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {', '.join(modules)}"],
+                          capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    totals = {}
+    for line in proc.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[0].startswith("import time:") or "self" in parts[0]: continue
+        pkg = parts[2].strip().split(".")[0]
+        totals[pkg] = totals.get(pkg, 0) + int(parts[0].split(":")[1])
+    return {k: round(v / 1000, 1) for k, v in sorted(totals.items(), key=lambda kv: -kv[1])[:top]}
+
+
+def run_startup_case(reruns=5):
+    """app.py 冷启动 (新进程, 第一次 run) 和之后每次 rerun 的耗时 (AppTest, 空 data 目录)"""
+    app = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    with tempfile.TemporaryDirectory() as data_dir:
+        proc = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, app, str(reruns)],
+                              capture_output=True, text=True, cwd=data_dir)
+    if proc.returncode: raise RuntimeError(proc.stderr[-2000:])
+    r = json.loads(proc.stdout.strip().splitlines()[-1])
+    xs = sorted(r["reruns_s"])
+    return {
+        "first_run_ms": round(r["first_run_s"] * 1000, 1),
+        "rerun_p50_ms": round(xs[len(xs) // 2] * 1000, 1) if xs else None,
+        "rerun_max_ms": round(xs[-1] * 1000, 1) if xs else None,
+        "errors": r["error"],
+        "import_ms": import_breakdown(["streamlit", "core", "assets", "badges"]),
+    }
+
+
+def git_version():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old, new, threshold=0.2):
+    """按 (mode, size, op) 对比 p95 和吞吐量"""
+    key = lambda c: (c["mode"], c["roster_size"], c["log_size"])
+    old_cases = {key(c): c for c in old["cases"]}
+    regressions = []
+    for case in new["cases"]:
+        base = old_cases.get(key(case))
+        if not base: continue
+        for op, m in case["ops"].items():
+            b = base["ops"].get(op)
+            if not b or not b["p95_ms"]: continue
+            ratio = m["p95_ms"] / b["p95_ms"]
+            flag = "REGRESSION" if ratio > 1 + threshold else ""
+            print(f"{case['mode']:>12} {case['roster_size']:>7} {op:<26} p95 {b['p95_ms']:>9.2f} -> {m['p95_ms']:>9.2f} ms  x{ratio:.2f} {flag}")
+            if flag: regressions.append((key(case), op))
+    return regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="DFMA check-in load test (fake Google Sheets backend)")
+    ap.add_argument("--modes", nargs="+", default=["high_traffic", "cloud"], choices=["high_traffic", "cloud"])
+    ap.add_argument("--sizes", nargs="*", type=int, default=[1000, 10000, 100000],
+                    help="roster size = existing log size for each case")
+    ap.add_argument("--attendees", type=int, default=50, help="concurrent simulated attendees")
+    ap.add_argument("--checkins", type=int, default=10, help="check-ins per attendee")
+    ap.add_argument("--latency", type=float, default=0.2, help="simulated Sheets round trip (s)")
+    ap.add_argument("--api", action="store_true", help="also benchmark the headless check-in API")
+    ap.add_argument("--startup", action="store_true", help="also measure app.py cold start / rerun time")
+    ap.add_argument("--reruns", type=int, default=5, help="reruns to time with --startup")
+    ap.add_argument("--out", help="write JSON result here (default: stdout)")
+    ap.add_argument("--compare", help="previous JSON result to compare against")
+    args = ap.parse_args(argv)
+
+    result = {"version": git_version(), "python": sys.version.split()[0], "cases": []}
+    for mode in args.modes:
+        for size in args.sizes:
+            print(f"running {mode} size={size} ...", file=sys.stderr)
+            result["cases"].append(run_case(mode, size, size, args.attendees, args.checkins, args.latency))
+    if args.api:
+        for size in args.sizes:
+            print(f"running api size={size} ...", file=sys.stderr)
+            result["cases"].append(run_api_case(size, args.attendees, args.checkins))
+    if args.startup:
+        print("running startup ...", file=sys.stderr)
+        result["startup"] = run_startup_case(args.reruns)
+
+    text = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f: f.write(text)
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f: old = json.load(f)
+        if compare(old, result): return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
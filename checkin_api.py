@@ -0,0 +1,280 @@
+"""独立的签到 API (asyncio, 不经过 Streamlit)
+
+    python checkin_api.py --port 8600            # 手机打开 http://<host>:8600/
+    python checkin_api.py --data-dir /srv/dfma   # 跟 app.py 用同一个数据目录
+
+Streamlit (app.py) 只负责管理和投屏; 门口的 kiosk / 手机直接打这个 API。
+跟 app.py 共用 sessions.json、签到库和名单快照; 写入走 Backend.write_logs, 按批提交。
+
+    GET  /                          静态签到页 (static/checkin.html)
+    GET  /api/session?code=123456   -> {"name": ...}
+    GET  /api/search?code=..&q=ali  -> {"names": [...]}
+    POST /api/checkin  {"code", "name", "ic"}            -> {"ok", "status", "name", "session"}
+    POST /api/walkin   {"code", "name", "email", "phone"} -> 同上
+    重复签到: 409 {"ok": false, "error": ..., "first_checkin": "YYYY-MM-DD HH:MM:SS"}
+    IC 连续错太多次: 429 {"ok": false, "error": ..., "retry_after": 秒}
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from urllib.parse import urlsplit, parse_qs
+
+from core import Backend, verify_ic
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+MAX_BODY = 64 * 1024
+IC_MAX_FAILURES = 5      # 同一 session + 名字, IC 后 4 位在 IC_WINDOW 秒内最多错这么多次
+IC_WINDOW = 300
+REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+           405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 429: "Too Many Requests",
+           500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+class AttemptLimiter:
+    """IC 只有后 4 位 (一万种): 按 key 记最近的失败时间, 窗口内错满 max_failures 次就先拒绝"""
+
+    def __init__(self, max_failures=IC_MAX_FAILURES, window=IC_WINDOW):
+        self.max_failures = max_failures
+        self.window = window
+        self._failures = {}
+
+    def _recent(self, key, now):
+        q = self._failures.get(key)
+        if q is None: return None
+        while q and now - q[0] > self.window: q.popleft()
+        if not q: del self._failures[key]
+        return q or None
+
+    def retry_after(self, key):
+        """还要等几秒 (0 = 可以试)"""
+        now = time.monotonic()
+        q = self._recent(key, now)
+        if q is None or len(q) < self.max_failures: return 0
+        return int(self.window - (now - q[0])) + 1
+
+    def fail(self, key):
+        now = time.monotonic()
+        q = self._recent(key, now)
+        if q is None: q = self._failures[key] = deque(maxlen=self.max_failures)
+        q.append(now)
+
+    def reset(self, key):
+        self._failures.pop(key, None)
+
+
+class BatchWriter:
+    """把同时到达的签到攒成一批, 在线程池里一次 write_logs"""
+
+    def __init__(self, backend, max_batch=200, max_wait=0.005):
+        self.backend = backend
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self._queue = asyncio.Queue()
+
+    async def submit(self, session_data, name, user_type, email="-", phone="-"):
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put(((session_data, name, user_type, email, phone), fut))
+        return await fut
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(items) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0: break
+                try: items.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError: break
+            try:
+                results = await loop.run_in_executor(None, self.backend.write_logs, [e for e, _ in items])
+                for (_, fut), result in zip(items, results):
+                    if not fut.done(): fut.set_result(result)
+            except Exception as e:
+                for _, fut in items:
+                    if not fut.done(): fut.set_exception(e)
+            self.batches += 1
+
+
+class CheckinAPI:
+    def __init__(self, backend, search_k=8):
+        self.backend = backend
+        self.search_k = search_k
+        self.writer = BatchWriter(backend)
+        self.ic_attempts = AttemptLimiter()
+        self._static = {}
+        self._connections = set()
+        self._stopping = asyncio.Event()
+
+    # --- 业务 ---
+    async def _write(self, s, name, user_type, email="-", phone="-"):
+        ok, status = await self.writer.submit(s, name, user_type, email=email, phone=phone)
+        if not ok: raise HTTPError(409, f"Already checked in at {status}", first_checkin=status)
+        return {"ok": True, "status": status, "name": name, "session": s['name']}
+
+    def _session(self, code):
+        session = self.backend.sessions.by_code(str(code or '').strip())
+        if session is None: raise HTTPError(404, "Invalid or inactive session code")
+        return session
+
+    async def get_session(self, query, body):
+        s = self._session(query.get('code'))
+        return {"name": s['name'], "duration": s.get('duration')}
+
+    async def search(self, query, body):
+        self._session(query.get('code'))
+        q = str(query.get('q', '')).strip()
+        names = self.backend.get_roster().search(q, self.search_k) if len(q) >= 2 else []
+        return {"names": names}
+
+    async def checkin(self, query, body):
+        s = self._session(body.get('code'))
+        name = str(body.get('name', ''))
+        row = self.backend.get_roster().by_name(name)
+        if row is None: raise HTTPError(404, "Name not found")
+        key = (s.get('id'), s['name'], name)
+        wait = self.ic_attempts.retry_after(key)
+        if wait: raise HTTPError(429, f"Too many failed attempts, try again in {wait}s", retry_after=wait)
+        if not verify_ic(row, str(body.get('ic', ''))):
+            self.ic_attempts.fail(key)
+            raise HTTPError(403, "IC Verification Failed")
+        self.ic_attempts.reset(key)
+        # 内存里已经有就直接拒绝, 不进写入队列
+        first = self.backend.attendance.first_checkin(s, name, row.get('Category', 'Unknown'), row.get('Email', '-'))
+        if first is not None: raise HTTPError(409, f"Already checked in at {first}", first_checkin=first)
+        return await self._write(s, name, row.get('Category', 'Unknown'), email=row.get('Email', '-'))
+
+    async def walkin(self, query, body):
+        s = self._session(body.get('code'))
+        name, email = str(body.get('name', '')).strip(), str(body.get('email', '')).strip()
+        if not name or not email: raise HTTPError(400, "Missing fields")
+        return await self._write(s, name, "Walk-in", email=email, phone=str(body.get('phone', '-')))
+
+    # --- HTTP ---
+    ROUTES = {
+        ("GET", "/api/session"): "get_session",
+        ("GET", "/api/search"): "search",
+        ("POST", "/api/checkin"): "checkin",
+        ("POST", "/api/walkin"): "walkin",
+    }
+
+    def _static_file(self, name):
+        if name not in self._static:
+            with open(os.path.join(STATIC_DIR, name), 'rb') as f: self._static[name] = f.read()
+        return self._static[name]
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        if url.path in ("/", "/index.html"):
+            if method != "GET": raise HTTPError(405, "Method not allowed")
+            return 200, self._static_file("checkin.html"), "text/html; charset=utf-8"
+        if url.path == "/healthz":
+            return 200, b'{"ok": true}', "application/json"
+        handler = self.ROUTES.get((method, url.path))
+        if handler is None: raise HTTPError(404, "Not found")
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        try: data = json.loads(body) if body else {}
+        except ValueError: raise HTTPError(400, "Invalid JSON")
+        if not isinstance(data, dict): raise HTTPError(400, "Invalid JSON")
+        result = await getattr(self, handler)(query, data)
+        return 200, json.dumps(result).encode('utf-8'), "application/json"
+
+    async def handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line: break
+                try: method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                except ValueError: break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''): break
+                    k, _, v = line.decode('latin-1').partition(':')
+                    headers[k.strip().lower()] = v.strip()
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                body = None
+                try:
+                    try: length = int(headers.get('content-length') or 0)
+                    except ValueError: length = -1
+                    if length < 0: raise HTTPError(400, "Invalid Content-Length")
+                    if length > MAX_BODY: raise HTTPError(413, "Body too large")
+                    body = await reader.readexactly(length) if length else b''
+                    status, payload, ctype = await self.dispatch(method.upper(), target, body)
+                except HTTPError as e:
+                    status, ctype = e.status, "application/json"
+                    payload = json.dumps({"ok": False, "error": str(e), **e.extra}).encode('utf-8')
+                    # body 没读走, 这条连接后面的字节对不上了
+                    if body is None: keep_alive = False
+                except Exception as e:
+                    status, ctype = 500, "application/json"
+                    payload = json.dumps({"ok": False, "error": f"{type(e).__name__}: {e}"}).encode('utf-8')
+                await self._respond(writer, status, payload, ctype, keep_alive)
+                if not keep_alive: break
+        except ValueError:
+            # 请求行 / 头超过 StreamReader 的 limit (64KB): readline 抛 ValueError, 回 400 后断开
+            payload = json.dumps({"ok": False, "error": "Request line or header too long"}).encode('utf-8')
+            try: await self._respond(writer, 400, payload, "application/json", False)
+            except ConnectionError: pass
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            self._connections.discard(task)
+
+    @staticmethod
+    async def _respond(writer, status, payload, ctype, keep_alive):
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: {ctype}\r\nContent-Length: {len(payload)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + payload)
+        await writer.drain()
+
+    async def serve(self, host, port, ready=None):
+        server = await asyncio.start_server(self.handle, host, port)
+        writer_task = asyncio.create_task(self.writer.run())
+        if ready is not None: ready(server.sockets[0].getsockname()[1])
+        try:
+            async with server:
+                await self._stopping.wait()
+                # 不再接新连接; 进行中的连接 (可能还在等这一批写库) 自己跑完再停写入
+                server.close()
+                await asyncio.gather(*self._connections, return_exceptions=True)
+        finally:
+            writer_task.cancel()
+            await asyncio.gather(writer_task, return_exceptions=True)
+
+    def stop(self):
+        """在事件循环线程里调 (loop.call_soon_threadsafe(api.stop)); serve() 关掉监听, 等连接结束后返回"""
+        self._stopping.set()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="DFMA headless check-in API")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=8600)
+    ap.add_argument("--data-dir", default=".", help="same directory app.py runs in")
+    args = ap.parse_args(argv)
+
+    # conn=None: 完全本地, 名单用快照 / local_namelist.csv; 云同步仍在 Admin Panel 做
+    api = CheckinAPI(Backend(None, data_dir=args.data_dir))
+    print(f"check-in API on http://{args.host}:{args.port}/")
+    try: asyncio.run(api.serve(args.host, args.port))
+    except KeyboardInterrupt: pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# ☁️ 云端写入 (Write-behind 批量追加)
+# ==========================================
+
+def _gspread_worksheet(conn, worksheet):
+    """拿到底层 gspread worksheet; 公共表格或 fake 连接不支持时返回 None"""
+    try:
+        ws = conn.client._select_worksheet(worksheet=worksheet)
+    except (AttributeError, NotImplementedError):
+        return None
+    return ws if hasattr(ws, 'append_rows') else None
+
+def append_rows(conn, worksheet, rows, columns):
+    """只追加新行, 不重写整张表"""
+    if not rows: return
+    ws = _gspread_worksheet(conn, worksheet)
+    if ws is not None:
+        header = ws.row_values(1)
+        if not header:
+            header = list(columns)
+            ws.append_rows([header], value_input_option="USER_ENTERED")
+        missing = [c for c in columns if c not in header]
+        if missing:
+            # 旧表缺列 (例如 ID): 在表头后面补上
+            header = header + missing
+            ws.update('A1', [header])
+        values = [[str(r.get(c, '')) for c in header] for r in rows]
+        ws.append_rows(values, value_input_option="USER_ENTERED")
+        return
+    # 退路: 每批只做一次 read + update
+    existing = conn.read(worksheet=worksheet, ttl=0)
+    new_data = pd.DataFrame([[str(r.get(c, '')) for c in columns] for r in rows], columns=list(columns))
+    conn.update(worksheet=worksheet, data=pd.concat([existing, new_data], ignore_index=True))
+
+
+class CloudWriteQueue:
+    """签到先落盘到 spill 文件, 后台线程按间隔/数量批量追加到 Sheets"""
+
+    def __init__(self, conn, columns, worksheet="Logs", spill_file="cloud_pending.jsonl",
+                 flush_interval=5.0, flush_size=50, max_backoff=60.0, ledger=None, perf=None):
+        self.conn = conn
+        self.columns = list(columns)
+        self.worksheet = worksheet
+        self.spill_file = spill_file
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_backoff = max_backoff
+        self.ledger = ledger
+        self.perf = perf
+        self.last_error = None
+        self.last_flush = None
+        self._failures = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.RLock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._pending = self._load_spill()
+        self._thread = threading.Thread(target=self._run, name="cloud-write-behind", daemon=True)
+        self._thread.start()
+
+    def _load_spill(self):
+        rows = []
+        if os.path.exists(self.spill_file):
+            with open(self.spill_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line: continue
+                    try: rows.append(json.loads(line))
+                    except ValueError: pass  # 崩溃时写了一半的行
+        return rows
+
+    def _rewrite_spill(self):
+        tmp = self.spill_file + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for row in self._pending:
+                f.write(json.dumps(row) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.spill_file)
+
+    def enqueue_many(self, rows):
+        """立即返回; 行先 fsync 到 spill 文件, 崩溃也不会丢"""
+        if not rows: return
+        lines = "".join(json.dumps(row) + "\n" for row in rows)
+        with self._lock:
+            with open(self.spill_file, 'a', encoding='utf-8') as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending.extend(rows)
+            # 退避期间不提前唤醒
+            if len(self._pending) >= self.flush_size and not self._failures: self._wake.set()
+
+    def enqueue(self, row):
+        self.enqueue_many([row])
+
+    def pending_count(self):
+        with self._lock: return len(self._pending)
+
+    def flush(self):
+        """把当前积压的行一次追加上去; 成功返回条数, 失败抛异常且行保留"""
+        with self._flush_lock:
+            with self._lock: batch = list(self._pending)
+            if not batch: return 0
+            to_send = self.ledger.filter_unsynced(batch) if self.ledger else batch
+            t0 = time.perf_counter()
+            append_rows(self.conn, self.worksheet, to_send, self.columns)
+            if self.perf and self.perf.enabled: self.perf.record("cloud.flush", time.perf_counter() - t0)
+            if self.ledger: self.ledger.mark_pushed([r['_seq'] for r in to_send if '_seq' in r])
+            with self._lock:
+                # flush 期间新进来的行留在队列里
+                del self._pending[:len(batch)]
+                self._rewrite_spill()
+            self.last_flush = time.time()
+            return len(batch)
+
+    def paused(self):
+        """with queue.paused(): ... 期间后台线程不会 flush (给全量 sync 用)"""
+        return self._flush_lock
+
+    def _run(self):
+        while not self._stop.is_set():
+            if self._failures:
+                delay = min(self.flush_interval * (2 ** self._failures), self.max_backoff)
+            else:
+                delay = self.flush_interval
+            self._wake.wait(delay)
+            self._wake.clear()
+            try:
+                self.flush()
+                self._failures = 0
+                self.last_error = None
+            except Exception as e:
+                self._failures += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+
+    def stop(self, flush=True):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=5)
+        if flush: self.flush()
+
+
+# ==========================================
+# 🔁 增量同步 (水位线 + ID 去重)
+# ==========================================
+
+def _merge_ranges(ranges, seqs):
+    """[[lo, hi], ...] 并进一批 seq, 相邻的合并; 队列按写入顺序推, 一般只有一两段"""
+    out = []
+    for lo, hi in sorted([list(r) for r in ranges] + [[q, q] for q in seqs]):
+        if out and lo <= out[-1][1] + 1: out[-1][1] = max(out[-1][1], hi)
+        else: out.append([lo, hi])
+    return out
+
+
+class SyncLedger:
+    """持久化的同步水位线: 已同步到哪个本地 seq, 以及队列已推送但还没被水位线覆盖的 seq 区间"""
+
+    def __init__(self, state_file="sync_state.json"):
+        self.state_file = state_file
+        self._lock = threading.RLock()
+        self._last_sync_ids = set()
+        self.state = self._load()
+
+    def _load(self):
+        if os.path.exists(self.state_file):
+            try:
+                with open(self.state_file, 'r') as f: state = json.load(f)
+                if 'synced_seq' in state: return state
+            except ValueError: pass
+        return None
+
+    def _save(self):
+        tmp = self.state_file + ".tmp"
+        with open(tmp, 'w') as f: json.dump(self.state, f)
+        os.replace(tmp, self.state_file)
+
+    def filter_unsynced(self, rows):
+        """队列 flush 前调用: 去掉已经在 Sheets 上的行 (按保存的水位线 / 推送区间, 重启后也算);
+        没有 _seq 的旧 spill 行只能按 ID 判断"""
+        if not rows: return []
+        with self._lock:
+            synced = self.synced_mask([r.get('_seq', np.inf) for r in rows], [r.get('ID') for r in rows])
+            return [r for r, done in zip(rows, synced) if not done and r.get('ID') not in self._last_sync_ids]
+
+    def mark_pushed(self, seqs):
+        """队列 flush 成功后调用; 只记 seq 区间, 不随行数增长"""
+        with self._lock:
+            if self.state is None or not seqs: return  # 还没建立水位线, 下次 sync 会全量对账
+            floor = self.state.get('synced_seq', 0)
+            self.state['pushed_ranges'] = _merge_ranges(self.state.get('pushed_ranges', []), [q for q in seqs if q > floor])
+            self._save()
+
+    def synced_mask(self, seqs, ids):
+        """每一行是否已经在 Sheets 上: 水位线以下, 或者队列推过 (旧版状态文件里的 pushed_ids 也算)"""
+        state = self.state or {}
+        seqs = np.asarray(seqs)
+        mask = seqs <= state.get('synced_seq', 0)
+        for lo, hi in state.get('pushed_ranges', []): mask |= (seqs >= lo) & (seqs <= hi)
+        if state.get('pushed_ids'): mask |= np.isin(np.asarray(ids), state['pushed_ids'])
+        return mask
+
+    def _full_reconcile(self, conn, worksheet, local, columns):
+        """首次同步或本地库被替换: 读一次云端, 按 ID (旧数据按 Timestamp+Session+Name) 去重"""
+        try: cloud = conn.read(worksheet=worksheet, ttl=0).astype(str)
+        except Exception: cloud = pd.DataFrame(columns=columns)
+        seen_ids = set(cloud['ID']) if 'ID' in cloud.columns else set()
+        legacy_keys = set()
+        if {'Timestamp', 'Session', 'Name'} <= set(cloud.columns):
+            legacy_keys = set(zip(cloud['Timestamp'], cloud['Session'], cloud['Name']))
+        keys = zip(local['Timestamp'], local['Session'], local['Name'])
+        mask = [(i not in seen_ids) and (k not in legacy_keys) for i, k in zip(local['ID'], keys)]
+        return local.loc[mask]
+
+    def sync(self, conn, store, columns, worksheet="Logs"):
+        """只推送水位线之后的行; 返回推送条数"""
+        with self._lock:
+            seq = self.state.get('synced_seq', 0) if self.state else 0
+            # 水位线那一行的 ID 对不上 = 本地库换过了, 全量对账
+            verified = self.state is not None and (seq == 0 or store.get_id_at(seq) == self.state.get('last_id'))
+            if verified:
+                local = store.read_df(after_seq=seq)
+                new_rows = local[~self.synced_mask(local['_seq'], local['ID'])]
+            else:
+                local = store.read_df()
+                new_rows = self._full_reconcile(conn, worksheet, local, columns)
+            new_rows = new_rows.drop_duplicates(subset=['ID'])
+
+            records = new_rows[columns].to_dict('records')
+            append_rows(conn, worksheet, records, columns)
+            self._last_sync_ids = set(new_rows['ID'])
+            if len(local):
+                seq, last_id = int(local['_seq'].iloc[-1]), local['ID'].iloc[-1]
+            else:
+                last_id = self.state.get('last_id') if verified else None
+            # 新水位线之后队列推过的区间继续保留
+            ranges = [[max(lo, seq + 1), hi] for lo, hi in (self.state or {}).get('pushed_ranges', []) if hi > seq]
+            self.state = {"synced_seq": seq, "last_id": last_id, "pushed_ranges": ranges}
+            self._save()
+            return len(records)
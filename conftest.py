@@ -0,0 +1 @@
+# pytest 从仓库根目录 import 模块 (tests/ 里直接 import cloud, logstore ...)
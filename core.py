@@ -0,0 +1,335 @@
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from live_feed import LogTailer, ChangeNotifier
+from analytics import AttendanceStats
+from attendance import AttendanceIndex, attendee_key, session_key
+from cloud import CloudWriteQueue, SyncLedger
+from logstore import CheckinStore, PARTITION_COLUMN, ATTENDEE_COLUMN
+from archive import LogArchive, archive_key
+from badges import load_secret, verify_badge
+from kiosk import KioskQueue
+from reports import ReportJobs
+from session_registry import SessionRegistry
+from roster import RosterProvider
+from perf import PerfRecorder
+
+# ==========================================
+# 🛠️ 核心逻辑 (不依赖 Streamlit; app.py / 压测 / API 共用)
+# ==========================================
+
+# 数据文件 (相对 data_dir)
+SESSION_FILE = "sessions.json"
+BACKUP_FILE = "local_backup_logs.csv"   # 旧版 CSV 备份, 首次启动导入 LOG_DB
+LOG_DB = "checkins.db"
+LOCAL_NAMELIST = "local_namelist.csv"
+ROSTER_SNAPSHOT = "roster_snapshot.pkl"
+SYNC_STATE_FILE = "sync_state.json"
+CLOUD_SPILL_FILE = "cloud_pending.jsonl"
+ARCHIVE_DIR = "archive"   # 已结束 session 压缩归档 (Parquet)
+BADGE_SECRET_FILE = "badge_secret.key"   # 没配 DFMA_BADGE_SECRET / st.secrets 时自动生成
+REPORTS_DIR = "exports"   # 导出的报表 (CSV zip / XLSX)
+
+LOG_COLUMNS = ["Timestamp", "Session", "Name", "Type", "Status", "Email", "Phone", "ID"]
+PARTICIPANT_COLUMNS = ['Name', 'Email', 'Category', 'IC']
+
+
+def kl_now():
+    return datetime.utcnow() + timedelta(hours=8)
+
+
+def clean_ic(series):
+    """清洗 IC (去除 .0 和空格)"""
+    return series.str.replace(r'\.0$', '', regex=True).str.strip()
+
+
+def verify_ic(participant, ic_last4):
+    """IC 后 4 位验证"""
+    real_ic = str(participant.get('IC', '0000')).replace('.0', '').strip()
+    return len(ic_last4) == 4 and real_ic.endswith(ic_last4)
+
+
+class Backend:
+    """一个进程一份: 签到库、session 表、名单、云端队列都挂在这里"""
+
+    def __init__(self, conn, data_dir=".", feed_size=8, roster_ttl=600,
+                 cloud_flush_interval=5, cloud_flush_size=50, perf_enabled=True, badge_secret=None, connect=None):
+        """conn: Sheets 连接; 或者传 connect (无参工厂), 第一次真正读写 Sheets 时才建连接"""
+        path = lambda name: os.path.join(data_dir, name)
+        self._conn = conn
+        self._connect = connect
+        self._conn_lock = threading.Lock()
+        self.local_namelist = path(LOCAL_NAMELIST)
+        self.roster_snapshot = path(ROSTER_SNAPSHOT)
+        self.cloud_spill_file = path(CLOUD_SPILL_FILE)
+        self.roster_ttl = roster_ttl
+        self.cloud_flush_interval = cloud_flush_interval
+        self.cloud_flush_size = cloud_flush_size
+        self.badge_secret_file = path(BADGE_SECRET_FILE)
+        self._badge_secret_setting = badge_secret or os.environ.get("DFMA_BADGE_SECRET")
+
+        self.perf = PerfRecorder(enabled=perf_enabled)
+        self.sessions = SessionRegistry(path(SESSION_FILE))
+        # 旧库的行按 session 名补上 session_id (同名 session 取最早建的); 只在迁移时做一次
+        self.store = CheckinStore(path(LOG_DB), LOG_COLUMNS, legacy_csv=path(BACKUP_FILE),
+                                  legacy_partitions={s['name']: s['id'] for s in reversed(self.sessions.all()) if 'id' in s})
+        self.notifier = ChangeNotifier()
+        self.tailer = LogTailer(self.store, recent_n=feed_size)
+        self.stats = AttendanceStats(self.store)
+        self.ledger = SyncLedger(path(SYNC_STATE_FILE))
+        self.archive = LogArchive(path(ARCHIVE_DIR), LOG_COLUMNS)
+        self.attendance = AttendanceIndex(self.store)
+        self._lock = threading.Lock()
+        self._cloud_queue = None
+        self._roster_provider = None
+        self._badge_secret = None
+        self._kiosk_queue = None
+        self.reports = ReportJobs(path(REPORTS_DIR))
+        # 上次崩溃时还没推上去的行, 启动后继续推 (没有 Sheets 连接的进程不碰, 留给 app.py)
+        if self._has_sheets() and os.path.exists(self.cloud_spill_file): self.cloud_queue
+
+    def _has_sheets(self):
+        return self._conn is not None or self._connect is not None
+
+    # --- 懒加载 (第一次用到才建) ---
+    @property
+    def cloud_queue(self):
+        """Cloud 模式的 write-behind 队列 (全进程共用一个后台线程)"""
+        with self._lock:
+            if self._cloud_queue is None:
+                self._cloud_queue = CloudWriteQueue(
+                    self.conn, LOG_COLUMNS, worksheet="Logs", spill_file=self.cloud_spill_file,
+                    flush_interval=self.cloud_flush_interval, flush_size=self.cloud_flush_size,
+                    ledger=self.ledger, perf=self.perf)
+            return self._cloud_queue
+
+    @property
+    def roster_provider(self):
+        """快照秒开, 过期后台刷新; 没有快照时才同步读一次 (失败就用本地名单, 不再拉第二次)。
+        没有 Sheets 连接 (checkin_api.py) 时不去拉, 只跟着 app.py 写的快照文件更新"""
+        with self._lock:
+            if self._roster_provider is None:
+                fetch = self.fetch_participants if self._has_sheets() else None
+                self._roster_provider = RosterProvider(
+                    fetch, self.roster_snapshot, ttl=self.roster_ttl,
+                    fallback=self.read_local_namelist)
+            return self._roster_provider
+
+    @property
+    def conn(self):
+        if self._conn is None and self._connect is not None:
+            with self._conn_lock:
+                if self._conn is None:
+                    with self.perf.stage("startup.sheets_connect"):
+                        self._conn = self._connect()
+        return self._conn
+
+    @property
+    def badge_secret(self):
+        with self._lock:
+            if self._badge_secret is None:
+                self._badge_secret = load_secret(self.badge_secret_file, self._badge_secret_setting)
+            return self._badge_secret
+
+    @property
+    def kiosk_queue(self):
+        """kiosk 扫码的批量写入队列 (本地库, 和 High Traffic 模式一样不等 Sheets)"""
+        with self._lock:
+            if self._kiosk_queue is None:
+                self._kiosk_queue = KioskQueue(self.write_logs)
+            return self._kiosk_queue
+
+    # --- 数据读取 (IC 验证支持) ---
+    def fetch_participants(self):
+        """从 Sheets 读取 Name, Email, Category, IC (失败直接抛异常); ttl=0: 缓存由 RosterProvider 管, 刷新要拿到最新的"""
+        with self.perf.stage("roster.sheet_read"):
+            df = self.conn.read(worksheet="Participants", usecols=[0, 1, 2, 3], ttl=0)
+        current_cols = df.columns.tolist()
+
+        rename_map = {}
+        for i in range(min(len(current_cols), 4)):
+            rename_map[current_cols[i]] = PARTICIPANT_COLUMNS[i]
+        df = df.rename(columns=rename_map)
+
+        for col in PARTICIPANT_COLUMNS:
+            if col not in df.columns: df[col] = '-'
+
+        df = df.astype(str)
+        df['IC'] = clean_ic(df['IC'])
+        return df.dropna(subset=['Name'])
+
+    def read_local_namelist(self):
+        """本地名单 local_namelist.csv; 没有或读不了时返回空表"""
+        if os.path.exists(self.local_namelist):
+            try:
+                df = pd.read_csv(self.local_namelist).astype(str)
+                if 'IC' in df.columns: df['IC'] = clean_ic(df['IC'])
+                return df
+            except Exception: pass
+        return pd.DataFrame(columns=PARTICIPANT_COLUMNS)
+
+    def get_participants_data(self):
+        """读取 Name, Email, Category, IC; Sheets 不通时用本地名单"""
+        try: return self.fetch_participants()
+        except Exception: return self.read_local_namelist()
+
+    def get_roster(self):
+        return self.roster_provider.get()
+
+    def get_logs_data(self):
+        if self.store.max_seq(): return self.store.read_df().drop(columns=['_seq'])
+        try: return self.conn.read(worksheet="Logs", ttl=0)
+        except Exception: return pd.DataFrame()
+
+    # --- 状态写入 ---
+    def calculate_status(self, session_data, now=None):
+        now = now or kl_now()
+        late_threshold = self.sessions.late_threshold(session_data)
+        if late_threshold is not None and now > late_threshold: return "Late"
+        return "On-time"
+
+    def _build_row(self, session_data, name, user_type, email, phone, now):
+        with self.perf.stage("write_log.status"):
+            status = self.calculate_status(session_data, now)
+        return {
+            "Timestamp": now.strftime("%Y-%m-%d %H:%M:%S"),
+            "Session": session_data['name'],
+            "Name": name,
+            "Type": user_type,
+            "Status": status,
+            "Email": email,
+            "Phone": phone,
+            "ID": uuid.uuid4().hex,
+            PARTITION_COLUMN: str(session_data.get('id', '')) or None,
+            ATTENDEE_COLUMN: attendee_key(name, user_type, email),
+        }
+
+    def write_logs(self, entries, high_traffic=True):
+        """批量签到: entries = [(session_data, name, user_type, email, phone)], 一次提交
+        返回每条的 (True, status); 重复签到是 (False, 第一次签到时间), 不写库"""
+        now = kl_now()
+        timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
+        results = [None] * len(entries)
+        with self.perf.stage("write_log.dedupe"):
+            # 先查内存 (不碰库); 没见过的再跟上别的进程的写入 (有节流), 然后原子占位
+            for i, (session_data, name, user_type, email, _) in enumerate(entries):
+                first = self.attendance.first_checkin(session_data, name, user_type, email)
+                if first is not None: results[i] = (False, first)
+            if any(r is None for r in results): self.attendance.catch_up()
+            accepted = []
+            for i, (session_data, name, user_type, email, _) in enumerate(entries):
+                if results[i] is not None: continue
+                first = self.attendance.reserve(session_data, name, user_type, email, timestamp)
+                if first is not None: results[i] = (False, first)
+                else: accepted.append(i)
+        if not accepted: return results
+
+        rows = [self._build_row(*entries[i], now) for i in accepted]
+        try:
+            with self.perf.stage("write_log.store_append"):
+                inserted = self.store.append_many(rows)
+        except Exception:
+            for i in accepted: self.attendance.release(*entries[i][:4], timestamp)
+            raise
+        # 内存占位只管本进程; 别的进程 (checkin_api.py) 刚写过的同一个人被库的唯一约束挡掉
+        if len(inserted) < len(rows):
+            kept = []
+            for i, row in zip(accepted, rows):
+                if row['ID'] in inserted:
+                    kept.append((i, row))
+                    continue
+                first = self.store.first_checkin(row[PARTITION_COLUMN], row[ATTENDEE_COLUMN]) or timestamp
+                self.attendance.release(*entries[i][:4], timestamp)
+                self.attendance.reserve(*entries[i][:4], first)
+                results[i] = (False, first)
+            accepted, rows = [i for i, _ in kept], [r for _, r in kept]
+            if not rows: return results
+        for row in rows: row['_seq'] = inserted[row['ID']]
+        for key in {session_key(r[PARTITION_COLUMN], r['Session']) for r in rows}:
+            self.notifier.bump(key)
+
+        if not high_traffic:
+            # 不等 Sheets, 后台批量追加
+            with self.perf.stage("write_log.cloud_enqueue"):
+                self.cloud_queue.enqueue_many(rows)
+        for i, row in zip(accepted, rows): results[i] = (True, row['Status'])
+        return results
+
+    def scan_badge(self, session_data, token):
+        """kiosk 扫码: 本地验签 (不查名单) + 内存查重, 通过就入队; 返回 (ok, 名字或原因)。
+        每次扫码都按签到码从注册表重新取 session: 已删除 / 停用的直接拒绝, 改过时间的用最新的"""
+        with self.perf.stage("kiosk.scan"):
+            live = self.sessions.by_code(session_data.get('code'))
+            if live is None or live.get('id') != session_data.get('id'): return False, "Session is closed"
+            session_data = live
+            badge = verify_badge(self.badge_secret, token)
+            if badge is None: return False, "Invalid badge"
+            first = self.attendance.first_checkin(session_data, badge['Name'], badge['Category'], badge['Email'])
+            if first is not None: return False, f"{badge['Name']} already checked in at {first}"
+            self.kiosk_queue.submit(session_data, badge['Name'], badge['Category'], badge['Email'])
+        return True, badge['Name']
+
+    def write_log(self, session_data, name, user_type, email="-", phone="-", high_traffic=True):
+        """(True, status); 已经签过到返回 (False, 第一次签到时间)"""
+        result, = self.write_logs([(session_data, name, user_type, email, phone)], high_traffic=high_traffic)
+        return result
+
+    def rescore_session(self, session_data):
+        """改了 session 时间后, 按新的迟到时间点一次性重算这个 session 所有行的 Status, 只写回变了的行"""
+        threshold = self.sessions.late_threshold(session_data)
+        if threshold is None: raise ValueError(f"Session {session_data.get('name')} has no valid late threshold")
+        with self.perf.stage("rescore.session"):
+            df = self.store.read_df(session_id=session_data.get('id', ''), session=session_data['name'])
+            if df.empty: return 0
+            ts = pd.to_datetime(df['Timestamp'], format="%Y-%m-%d %H:%M:%S", errors='coerce')
+            status = np.where(ts > threshold, "Late", "On-time")
+            changed = ts.notna().to_numpy() & (status != df['Status'].to_numpy())
+            self.store.update_status(zip(df['_seq'].to_numpy()[changed].tolist(), status[changed].tolist()))
+        if changed.any():
+            self.stats.invalidate()
+            self.notifier.bump(session_key(session_data.get('id'), session_data['name']))
+        return int(changed.sum())
+
+    # --- 归档 ---
+    def start_report(self, sessions, fmt="xlsx"):
+        """后台导出一份报表 (签到 / 迟到 / 按 Category 的未到名单); 返回 job id, 进度看 self.reports.jobs()"""
+        spec = {"db_path": self.store.db_path, "archive_dir": self.archive.folder, "columns": [c for c in LOG_COLUMNS if c != 'ID'],
+                "sessions": [{"id": s.get('id'), "name": s['name']} for s in sessions],
+                "roster": self.get_roster().to_frame()}
+        return self.reports.submit(spec, fmt)
+
+    def closed_partitions(self):
+        """库里还有行、但 session 已删除或停用的分区"""
+        live = self.sessions.active()
+        live_ids, live_names = {str(s.get('id')) for s in live}, {s['name'] for s in live}
+        return [p for p in self.store.partitions()
+                if ((p['session_id'] not in live_ids) if p['session_id'] else (p['Session'] not in live_names))]
+
+    def archive_session(self, session_id, session_name, force=False):
+        """把一个 session 的行压进 archive/<key>.parquet 并从库里删掉; 还没同步到 Sheets 的默认不归档"""
+        session_id = session_id or ''
+        with self.perf.stage("archive.session"):
+            df = self.store.read_df(session_id=session_id, session=session_name)
+            if df.empty: return 0
+            unsynced = ~self.ledger.synced_mask(df['_seq'], df['ID'])
+            if unsynced.any() and not force:
+                raise ValueError(f"{int(unsynced.sum())} row(s) of {session_name} are not synced to Sheets yet")
+            self.archive.write(archive_key(session_id, session_name), df, session_name, session_id)
+            self.store.drop_partition(session_id, session_name, max_seq=int(df['_seq'].max()))
+        return len(df)
+
+    def sync_local_to_cloud(self):
+        if not self.store.max_seq(): return "No local data."
+        try:
+            queue = self.cloud_queue
+            # 先把队列里的推上去, sync 期间暂停后台 flush, 避免重复
+            with queue.paused(), self.perf.stage("cloud.sync"):
+                queue.flush()
+                pushed = self.ledger.sync(self.conn, self.store, LOG_COLUMNS, worksheet="Logs")
+            return f"✅ Synced {pushed} new records!"
+        except Exception as e: return f"❌ Error: {e}"
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pandas as pd
+
+# ==========================================
+# 🧪 本地假 GSheetsConnection (测试/压测用)
+# ==========================================
+
+class FakeWorksheet:
+    def __init__(self, book, name):
+        self._book = book
+        self.name = name
+
+    def row_values(self, row):
+        self._book._sleep()
+        with self._book._lock:
+            df = self._book.sheets.get(self.name)
+            if df is None or (row == 1 and len(df.columns) == 0): return []
+            if row == 1: return [str(c) for c in df.columns]
+            return [str(v) for v in df.iloc[row - 2].tolist()]
+
+    def update(self, range_name, values):
+        """只支持改表头 (A1)"""
+        self._book._sleep()
+        with self._book._lock:
+            df = self._book.sheets.get(self.name, pd.DataFrame())
+            header = values[0]
+            self._book.sheets[self.name] = df.reindex(columns=df.columns.tolist() + header[len(df.columns):])
+
+    def append_rows(self, values, value_input_option=None):
+        self._book._sleep()
+        self._book.calls['append_rows'] += 1
+        with self._book._lock:
+            df = self._book.sheets.get(self.name)
+            if df is None or len(df.columns) == 0:
+                header, values = values[0], values[1:]
+                df = pd.DataFrame(columns=header)
+            new_rows = pd.DataFrame(values, columns=df.columns)
+            self._book.sheets[self.name] = pd.concat([df, new_rows], ignore_index=True)
+
+
+class FakeClient:
+    def __init__(self, book):
+        self._book = book
+
+    def _select_worksheet(self, worksheet=None, **kwargs):
+        return FakeWorksheet(self._book, worksheet)
+
+
+class FakeGSheetsConnection:
+    """read/update 跟 GSheetsConnection 同签名, 数据存内存; latency 模拟网络往返 (秒)"""
+
+    def __init__(self, sheets=None, latency=0.0, fail_times=0):
+        self.sheets = {k: v.copy() for k, v in (sheets or {}).items()}
+        self.latency = latency
+        self.fail_times = fail_times
+        self.calls = {'read': 0, 'update': 0, 'append_rows': 0}
+        self._lock = threading.Lock()
+        self.client = FakeClient(self)
+
+    def _sleep(self):
+        if self.latency: time.sleep(self.latency)
+        with self._lock:
+            if self.fail_times > 0:
+                self.fail_times -= 1
+                raise ConnectionError("fake sheets: simulated failure")
+
+    def read(self, worksheet=None, usecols=None, ttl=None, **kwargs):
+        self._sleep()
+        self.calls['read'] += 1
+        with self._lock:
+            df = self.sheets.get(worksheet)
+            if df is None: raise KeyError(f"worksheet not found: {worksheet}")
+            df = df.copy()
+        if usecols is not None: df = df.iloc[:, list(usecols)]
+        return df
+
+    def update(self, worksheet=None, data=None, **kwargs):
+        self._sleep()
+        self.calls['update'] += 1
+        with self._lock: self.sheets[worksheet] = pd.DataFrame(data).reset_index(drop=True)
+        return data
@@ -0,0 +1,51 @@
+import queue
+import threading
+import time
+from collections import deque
+
+# ==========================================
+# 🚪 门口扫码 kiosk (扫一次立即返回, 后台按批写库)
+# ==========================================
+
+class KioskQueue:
+    """扫码线程只负责验签 + 入队; 后台线程每 flush_interval 秒把攒下的签到一次 write_logs"""
+
+    def __init__(self, write_logs, flush_interval=0.25, max_batch=200, recent_n=20):
+        self.write_logs = write_logs
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.last_error = None
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=recent_n)
+        self._thread = threading.Thread(target=self._run, name="kiosk-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, session_data, name, user_type, email="-"):
+        self._queue.put((session_data, name, user_type, email, "-"))
+
+    def pending_count(self):
+        return self._queue.qsize()
+
+    def recent(self):
+        """最近写入的结果, 新的在前: [{Name, ok, status}]; ok=False 是重复, None 是写库失败"""
+        with self._lock: return list(reversed(self._recent))
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0: break
+                try: batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty: break
+            try:
+                results = self.write_logs(batch)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                results = [(None, "not saved, please scan again")] * len(batch)
+            with self._lock:
+                for entry, (ok, status) in zip(batch, results):
+                    self._recent.append({"Name": entry[1], "ok": ok, "status": status})
@@ -0,0 +1,67 @@
+import threading
+from collections import deque
+
+from attendance import session_key
+
+# ==========================================
+# 📡 投屏实时数据 (增量读取签到库)
+# ==========================================
+
+class LogTailer:
+    """记住已读到的 seq, 每次只取新写入的行; 按分区 (session id) 计数, 同名的旧 session 不算进来"""
+
+    def __init__(self, store, recent_n=8):
+        self.store = store
+        self.recent_n = recent_n
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._last_seq = 0
+        self._counts = {}
+        self._recent = {}
+
+    def poll(self):
+        """读取上次之后写入的行; 库被清空或替换 (seq 倒退) 时从头重建"""
+        with self._lock:
+            rows = self.store.rows_after(self._last_seq)
+            if not rows:
+                if self.store.max_seq() < self._last_seq:
+                    self._reset()
+                    rows = self.store.rows_after(0)
+                if not rows: return
+            for row in rows:
+                session = session_key(row.get('session_id'), row['Session'])
+                self._counts[session] = self._counts.get(session, 0) + 1
+                recent = self._recent.get(session)
+                if recent is None:
+                    recent = self._recent[session] = deque(maxlen=self.recent_n)
+                recent.append({"Name": row['Name'], "Timestamp": row['Timestamp']})
+            self._last_seq = rows[-1]['_seq']
+
+    def snapshot(self, session_data):
+        """返回 (总数, 最近 N 条, 新的在前)"""
+        key = session_key(session_data.get('id'), session_data['name'])
+        with self._lock:
+            recent = self._recent.get(key, ())
+            return self._counts.get(key, 0), list(reversed(recent))
+
+
+class ChangeNotifier:
+    """write_log 每写一条就给对应 session (attendance.session_key) 的版本号 +1, 投屏只在版本变了才重新取数据"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._total = 0
+
+    def bump(self, key):
+        with self._lock:
+            self._versions[key] = self._versions.get(key, 0) + 1
+            self._total += 1
+
+    def version(self, key=None):
+        """key=None 时返回所有 session 的总版本"""
+        with self._lock:
+            if key is None: return self._total
+            return self._versions.get(key, 0)
@@ -0,0 +1,241 @@
+import csv
+import io
+import os
+import queue
+import sqlite3
+import threading
+import uuid
+
+import pandas as pd
+
+# ==========================================
+# 🗄️ 本地签到库 (SQLite WAL, 单写线程 + group commit)
+# ==========================================
+
+PARTITION_COLUMN = "session_id"   # 内部分区列 (不进 Sheets), 按 session id 建索引
+ATTENDEE_COLUMN = "attendee_key"  # 内部查重列 (不进 Sheets): UNIQUE(session_id, attendee_key), 多进程同时签到以库为准
+
+
+def _chunks(cursor, chunk):
+    while True:
+        rows = cursor.fetchmany(chunk)
+        if not rows: return
+        yield rows
+
+
+def read_chunks(db_path, columns, session=None, chunk=5000, session_id=None):
+    """只读连接按块读一个 session 的行 (tuple, 按 columns 顺序); 不建写线程, 给导出子进程用。
+    session_id 走分区列 ('' = 还没分区的旧行), 同名的别的 session 不会混进来"""
+    cols_sql = ", ".join(f'"{c}"' for c in columns)
+    clauses, args = [], []
+    if session_id is not None:
+        clauses.append(f'{PARTITION_COLUMN} IS ?')
+        args.append(str(session_id) if session_id != '' else None)
+    if session is not None:
+        clauses.append('"Session" = ?')
+        args.append(session)
+    where = 'WHERE ' + ' AND '.join(clauses) if clauses else ''
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=30)
+    try: yield from _chunks(conn.execute(f'SELECT {cols_sql} FROM logs {where} ORDER BY seq', args), chunk)
+    finally: conn.close()
+
+
+class CheckinStore:
+    """所有签到写入都交给一个写线程, 一次事务提交一批; 读取各线程用自己的连接"""
+
+    def __init__(self, db_path, columns, legacy_csv=None, batch_max=256, legacy_partitions=None):
+        """legacy_partitions: {session 名: id}, 只在迁移时 (旧库第一次加分区列 / 导入旧 CSV) 给没有分区的行补一次"""
+        self.db_path = db_path
+        self.columns = list(columns)
+        self.batch_max = batch_max
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._cols_sql = ", ".join(f'"{c}"' for c in self.columns)
+        self._insert_sql = (f'INSERT OR IGNORE INTO logs ({self._cols_sql}, {PARTITION_COLUMN}, {ATTENDEE_COLUMN}) '
+                            f'VALUES ({", ".join("?" * (len(self.columns) + 2))})')
+
+        self._writer = self._connect()
+        self._init_schema(legacy_csv, legacy_partitions or {})
+        self._thread = threading.Thread(target=self._run, name="checkin-writer", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _backfill_partitions(self, session_ids):
+        """没有 session_id 的行按 {session 名: id} 补上; 对不上的留 NULL (写线程还没起, 直接用写连接)"""
+        values = [(str(sid), name) for name, sid in session_ids.items()]
+        if values: self._writer.executemany(f'UPDATE logs SET {PARTITION_COLUMN} = ? WHERE {PARTITION_COLUMN} IS NULL AND "Session" = ?', values)
+
+    def _init_schema(self, legacy_csv, legacy_partitions):
+        cols = ", ".join(f'"{c}" TEXT' for c in self.columns if c != 'ID')
+        with self._writer:
+            self._writer.execute(f'CREATE TABLE IF NOT EXISTS logs (seq INTEGER PRIMARY KEY AUTOINCREMENT, {cols}, "ID" TEXT UNIQUE, {PARTITION_COLUMN} TEXT, {ATTENDEE_COLUMN} TEXT)')
+            # 旧库没有分区列 / 查重列: 补上。分区只在加列这一次按当时的 session 名补 (之后同名的新 session 不会认领旧行);
+            # 查重列留 NULL: 旧库里可能已经有重复, NULL 不受唯一约束, 这些行的查重还是靠内存索引
+            existing = {r[1] for r in self._writer.execute("PRAGMA table_info(logs)")}
+            if PARTITION_COLUMN not in existing:
+                self._writer.execute(f'ALTER TABLE logs ADD COLUMN {PARTITION_COLUMN} TEXT')
+                self._backfill_partitions(legacy_partitions)
+            if ATTENDEE_COLUMN not in existing:
+                self._writer.execute(f'ALTER TABLE logs ADD COLUMN {ATTENDEE_COLUMN} TEXT')
+            # 早先的查重键按规范化名字 ('name:chloe ng'), 不同的名单名字会撞; 改成原名 (见 attendance.attendee_key)
+            self._writer.execute(f'''UPDATE logs SET {ATTENDEE_COLUMN} = 'member:' || "Name" WHERE {ATTENDEE_COLUMN} LIKE 'name:%' ''')
+            self._writer.execute('CREATE INDEX IF NOT EXISTS idx_logs_session ON logs ("Session", seq)')
+            self._writer.execute(f'CREATE INDEX IF NOT EXISTS idx_logs_partition ON logs ({PARTITION_COLUMN}, seq)')
+            self._writer.execute('CREATE INDEX IF NOT EXISTS idx_logs_ts ON logs ("Timestamp")')
+            self._writer.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS idx_logs_attendee ON logs ({PARTITION_COLUMN}, {ATTENDEE_COLUMN}) '
+                                 f'WHERE {ATTENDEE_COLUMN} IS NOT NULL')
+            # 归档出去的行只留 seq + ID, 同步水位线校验还要用
+            self._writer.execute('CREATE TABLE IF NOT EXISTS archived (seq INTEGER PRIMARY KEY, "ID" TEXT)')
+        # 旧版 CSV 备份: 从没写过行的新库才导入一次 (归档后 logs 表也会是空的, 所以看 AUTOINCREMENT 计数器)
+        fresh = self._writer.execute("SELECT 1 FROM sqlite_sequence WHERE name = 'logs'").fetchone() is None
+        if fresh and legacy_csv and os.path.exists(legacy_csv):
+            old = pd.read_csv(legacy_csv, dtype=str, keep_default_na=False)
+            if 'ID' not in old.columns:
+                old['ID'] = [uuid.uuid4().hex for _ in range(len(old))]
+            old = old.reindex(columns=self.columns, fill_value='-')
+            old[PARTITION_COLUMN] = None
+            old[ATTENDEE_COLUMN] = None
+            with self._writer:
+                self._writer.executemany(self._insert_sql, old.itertuples(index=False, name=None))
+                self._backfill_partitions(legacy_partitions)
+
+    # --- 写入 ---
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            n = items[0][1]
+            # 把排队中的请求攒成一个事务
+            while n < self.batch_max:
+                try: item = self._queue.get_nowait()
+                except queue.Empty: break
+                items.append(item)
+                n += item[1]
+            try:
+                with self._writer:
+                    for statements, _, _, _ in items:
+                        for sql, rows in statements:
+                            self._writer.executemany(sql, rows)
+                error = None
+            except Exception as e:
+                error = e
+            for _, _, done, result in items:
+                result.append(error)
+                done.set()
+
+    def _submit(self, *statements):
+        """(sql, values) 交给写线程, 同一请求里的语句在同一个事务; 阻塞到提交为止"""
+        done, result = threading.Event(), []
+        self._queue.put((statements, sum(len(v) for _, v in statements), done, result))
+        done.wait()
+        if result[0] is not None: raise result[0]
+
+    def append_many(self, rows):
+        """阻塞到这批行提交为止 (通常和别的请求共用一次 commit)。
+        返回真正写进去的 {ID: seq}; 同一 (session_id, attendee_key) 已经有行时那一行被忽略"""
+        if not rows: return {}
+        values = [tuple(str(r.get(c, '-')) for c in self.columns) + (r.get(PARTITION_COLUMN), r.get(ATTENDEE_COLUMN))
+                  for r in rows]
+        self._submit((self._insert_sql, values))
+        ids = [str(r.get('ID')) for r in rows]
+        inserted = {}
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            sql = f'SELECT "ID", seq FROM logs WHERE "ID" IN ({", ".join("?" * len(chunk))})'
+            inserted.update(self._reader().execute(sql, chunk))
+        return inserted
+
+    def first_checkin(self, session_id, key):
+        """库里这个参加者在这个 session 第一次签到的时间; 没有返回 None"""
+        r = self._reader().execute(f'SELECT "Timestamp" FROM logs WHERE {PARTITION_COLUMN} IS ? AND {ATTENDEE_COLUMN} = ? '
+                                   f'ORDER BY seq LIMIT 1', (session_id, key)).fetchone()
+        return r[0] if r else None
+
+    def append(self, row):
+        self.append_many([row])
+
+    def update_status(self, changes):
+        """changes = [(seq, status)], 一个事务改完 (seq 不变, 增量读取的人要自己重建)"""
+        values = [(status, int(seq)) for seq, status in changes]
+        if values: self._submit(('UPDATE logs SET "Status" = ? WHERE seq = ?', values))
+
+    def partitions(self):
+        """[{session_id, Session, rows, first, last, max_seq}], 管理页列出可归档的 session"""
+        sql = (f'SELECT {PARTITION_COLUMN}, "Session", COUNT(*), MIN("Timestamp"), MAX("Timestamp"), MAX(seq) '
+               f'FROM logs GROUP BY {PARTITION_COLUMN}, "Session" ORDER BY MAX(seq)')
+        keys = ("session_id", "Session", "rows", "first", "last", "max_seq")
+        return [dict(zip(keys, r)) for r in self._reader().execute(sql)]
+
+    def drop_partition(self, session_id, session=None, max_seq=None):
+        """归档后删掉这个 session 的行, seq + ID 留在 archived 表;
+        只删 seq <= max_seq (归档时读到的最后一行), 归档期间新写入的留在库里"""
+        where, args = self._where(None, session, session_id)
+        if max_seq is not None:
+            where = f"{where} AND seq <= ?" if where else "WHERE seq <= ?"
+            args = args + [max_seq]
+        self._submit((f'INSERT OR IGNORE INTO archived (seq, "ID") SELECT seq, "ID" FROM logs {where}', [args]),
+                     (f'DELETE FROM logs {where}', [args]))
+
+    # --- 读取 ---
+    def max_seq(self):
+        """最后分配的 seq (AUTOINCREMENT 计数器, 归档删行后也不会倒退)"""
+        r = self._reader().execute("SELECT seq FROM sqlite_sequence WHERE name = 'logs'").fetchone()
+        return r[0] if r else 0
+
+    def _where(self, seq, session, session_id):
+        """按 seq / session 名 / session_id 过滤; session_id 走分区索引 ('' = 还没分区的旧行)"""
+        clauses, args = [], []
+        if seq is not None:
+            clauses.append('seq > ?')
+            args.append(seq)
+        if session_id is not None:
+            clauses.append(f'{PARTITION_COLUMN} IS ?')
+            args.append(str(session_id) if session_id != '' else None)
+        if session is not None:
+            clauses.append('"Session" = ?')
+            args.append(session)
+        if not clauses: return '', args
+        return 'WHERE ' + ' AND '.join(clauses), args
+
+    def rows_after(self, seq=0, session=None, limit=None, session_id=None):
+        """seq 之后的行 (dict, 带 _seq 和 session_id), 按写入顺序"""
+        where, args = self._where(seq, session, session_id)
+        sql = f'SELECT seq, {PARTITION_COLUMN}, {self._cols_sql} FROM logs {where} ORDER BY seq'
+        if limit: sql += f' LIMIT {int(limit)}'
+        out = []
+        for r in self._reader().execute(sql, args):
+            d = dict(zip(self.columns, r[2:]))
+            d['_seq'], d[PARTITION_COLUMN] = r[0], r[1]
+            out.append(d)
+        return out
+
+    def read_df(self, after_seq=0, session=None, session_id=None):
+        """读成 DataFrame (带 _seq 列)"""
+        where, args = self._where(after_seq, session, session_id)
+        sql = f'SELECT seq AS _seq, {self._cols_sql} FROM logs {where} ORDER BY seq'
+        return pd.read_sql_query(sql, self._reader(), params=args)
+
+    def get_id_at(self, seq):
+        r = self._reader().execute('SELECT "ID" FROM logs WHERE seq = ? UNION ALL SELECT "ID" FROM archived WHERE seq = ?',
+                                   (seq, seq)).fetchone()
+        return r[0] if r else None
+
+    def export_csv(self, session=None, chunk=5000, session_id=None):
+        """按块导出 CSV (bytes), 给下载按钮用"""
+        buf = io.StringIO()
+        w = csv.writer(buf)
+        w.writerow(self.columns)
+        where, args = self._where(None, session, session_id)
+        cur = self._reader().execute(f'SELECT {self._cols_sql} FROM logs {where} ORDER BY seq', args)
+        for rows in _chunks(cur, chunk): w.writerows(rows)
+        return buf.getvalue().encode('utf-8')
@@ -0,0 +1,89 @@
+import csv
+import io
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# ==========================================
+# ⏱️ 热路径计时 (Admin → Performance)
+# ==========================================
+
+class _NullStage:
+    """关掉计时时用的空 context, 几乎零开销"""
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+
+_NULL = _NullStage()
+
+
+class StageStats:
+    """一个阶段的计数 / 最大值 + 最近 N 次样本 (算 p50/p99)"""
+
+    __slots__ = ('count', 'total', 'max', 'samples')
+
+    def __init__(self, keep):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=keep)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max: self.max = seconds
+        self.samples.append(seconds)
+
+
+class PerfRecorder:
+    def __init__(self, enabled=True, keep=2048):
+        self.enabled = enabled
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def record(self, name, seconds):
+        with self._lock:
+            s = self._stages.get(name)
+            if s is None: s = self._stages[name] = StageStats(self.keep)
+            s.add(seconds)
+
+    def stage(self, name):
+        """with perf.stage("home.write_log"): ..."""
+        if not self.enabled: return _NULL
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name):
+        t0 = time.perf_counter()
+        try: yield
+        finally: self.record(name, time.perf_counter() - t0)
+
+    def reset(self):
+        with self._lock: self._stages.clear()
+
+    def summary(self):
+        """[{stage, count, mean_ms, p50_ms, p99_ms, max_ms}], 按阶段名排序"""
+        with self._lock:
+            items = [(n, s.count, s.total, s.max, sorted(s.samples)) for n, s in self._stages.items()]
+        rows = []
+        for name, count, total, mx, xs in sorted(items):
+            pct = lambda p: xs[min(len(xs) - 1, int(p * (len(xs) - 1)))] * 1000 if xs else 0.0
+            rows.append({
+                "stage": name, "count": count,
+                "mean_ms": round(total / count * 1000, 3) if count else 0.0,
+                "p50_ms": round(pct(0.50), 3), "p99_ms": round(pct(0.99), 3),
+                "max_ms": round(mx * 1000, 3),
+            })
+        return rows
+
+    def to_json(self):
+        return json.dumps(self.summary(), indent=2)
+
+    def to_csv(self):
+        buf = io.StringIO()
+        w = csv.DictWriter(buf, fieldnames=["stage", "count", "mean_ms", "p50_ms", "p99_ms", "max_ms"])
+        w.writeheader()
+        w.writerows(self.summary())
+        return buf.getvalue()
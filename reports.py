@@ -0,0 +1,194 @@
+import csv
+import os
+import re
+import tempfile
+import threading
+import time
+import zipfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from archive import LogArchive, archive_key
+from logstore import read_chunks
+
+# ==========================================
+# 📑 报表导出 (子进程里按块写 CSV / XLSX, 不占 UI / 签到线程)
+# ==========================================
+# 每次只在内存里留一块行 + 每个 session 的到场名字; openpyxl 用 write_only 模式
+
+REPORT_FORMATS = ("xlsx", "csv")
+CHUNK = 5000
+SUMMARY_COLUMNS = ["Session", "Checked-in", "On-time", "Late", "Walk-in", "Absent"]
+ABSENT_COLUMNS = ["Session", "Category", "Name", "Email"]
+SHEETS = ("Summary", "Attendance", "Late", "Absentees")
+
+
+def _session_rows(spec, session):
+    """一个 session 的行: 库里按分区 (session_id) 读, 跟 rescore / 归档一样; 再加上已归档的。
+    没有 id 的旧 session 只能按名字 (分区为空的行)"""
+    session_id = session.get('id') or ''
+    yield from read_chunks(spec['db_path'], spec['columns'], session=session['name'], chunk=CHUNK, session_id=session_id)
+    archive = LogArchive(spec['archive_dir'], spec['columns'])
+    yield from archive.iter_chunks(archive_key(session_id, session['name']), chunk=CHUNK)
+
+
+def _roster(spec):
+    frame = spec['roster']
+    if 'Category' not in frame.columns: frame = frame.assign(Category='Unknown')
+    if 'Email' not in frame.columns: frame = frame.assign(Email='-')
+    return frame[['Category', 'Name', 'Email']].astype(str)
+
+
+def _stream(spec, emit):
+    """按 session 流式读, emit(sheet, rows) 一块一块交给写入方; 返回写出的签到行数"""
+    cols = spec['columns']
+    i_name, i_type, i_status = cols.index('Name'), cols.index('Type'), cols.index('Status')
+    roster = _roster(spec)
+    total = 0
+    for session in spec['sessions']:
+        arrived, status, walk_in, n = set(), Counter(), 0, 0
+        for rows in _session_rows(spec, session):
+            emit("Attendance", rows)
+            emit("Late", [r for r in rows if r[i_status] == "Late"])
+            for r in rows:
+                arrived.add(r[i_name])
+                status[r[i_status]] += 1
+                walk_in += r[i_type] == "Walk-in"
+            n += len(rows)
+        absent = roster.loc[~roster['Name'].isin(arrived)].sort_values(['Category', 'Name'])
+        for i in range(0, len(absent), CHUNK):
+            emit("Absentees", [(session['name'],) + t for t in absent.iloc[i:i + CHUNK].itertuples(index=False, name=None)])
+        emit("Summary", [(session['name'], n, status["On-time"], status["Late"], walk_in, len(absent))])
+        total += n
+    return total
+
+
+def _headers(spec):
+    return {"Summary": SUMMARY_COLUMNS, "Attendance": spec['columns'],
+            "Late": spec['columns'], "Absentees": ABSENT_COLUMNS}
+
+
+def _write_xlsx(spec, path):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill
+    from openpyxl.utils import get_column_letter
+    wb = Workbook(write_only=True)
+    font, fill = Font(bold=True, color="FFFFFF"), PatternFill("solid", fgColor="1E3A8A")
+    sheets, counts = {}, {}
+    for title, header in _headers(spec).items():
+        ws = sheets[title] = wb.create_sheet(title)
+        ws.freeze_panes = "A2"
+        for i, h in enumerate(header, 1):
+            ws.column_dimensions[get_column_letter(i)].width = 14 if h in SUMMARY_COLUMNS[1:] else 22
+        cells = []
+        for h in header:
+            c = WriteOnlyCell(ws, h)
+            c.font, c.fill = font, fill
+            cells.append(c)
+        ws.append(cells)
+        counts[title] = 1
+
+    def emit(title, rows):
+        for r in rows: sheets[title].append(r)
+        counts[title] += len(rows)
+
+    total = _stream(spec, emit)
+    for title, header in _headers(spec).items():
+        sheets[title].auto_filter.ref = f"A1:{get_column_letter(len(header))}{counts[title]}"
+    wb.save(path)
+    return total
+
+
+def _write_csv(spec, path):
+    """每张表一个 CSV, 打成一个 zip"""
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(path)) as tmp:
+        files = {t: open(os.path.join(tmp, f"{t.lower()}.csv"), 'w', newline='', encoding='utf-8') for t in SHEETS}
+        try:
+            writers = {t: csv.writer(f) for t, f in files.items()}
+            for t, header in _headers(spec).items(): writers[t].writerow(header)
+            total = _stream(spec, lambda t, rows: writers[t].writerows(rows))
+        finally:
+            for f in files.values(): f.close()
+        with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+            for f in files.values(): zf.write(f.name, os.path.basename(f.name))
+    return total
+
+
+def build_report(spec, fmt, path):
+    """spec: {db_path, archive_dir, columns, sessions: [{id, name}], roster: DataFrame}; 在子进程里跑。
+    先写临时文件再 rename; 返回签到行数"""
+    fd, tmp = tempfile.mkstemp(prefix=".report-", suffix=".tmp", dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        total = (_write_xlsx if fmt == "xlsx" else _write_csv)(spec, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+    return total
+
+
+def _slug(text):
+    return re.sub(r'[^A-Za-z0-9_-]+', '_', str(text)).strip('_') or "session"
+
+
+class ReportJobs:
+    """导出任务排队给一个子进程按顺序做; jobs() 给 UI 看进度, 只保留最近 keep 份文件"""
+
+    def __init__(self, folder, keep=10):
+        self.folder = folder
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._jobs = []
+        self._next_id = 1
+        self._pool = None
+
+    def submit(self, spec, fmt="xlsx"):
+        if fmt not in REPORT_FORMATS: raise ValueError(f"Unknown report format: {fmt}")
+        if not spec['sessions']: raise ValueError("Pick at least one session")
+        os.makedirs(self.folder, exist_ok=True)
+        names = [s['name'] for s in spec['sessions']]
+        label = names[0] if len(names) == 1 else f"{len(names)} sessions"
+        ext = "xlsx" if fmt == "xlsx" else "zip"
+        with self._lock:
+            job_id = self._next_id
+            self._next_id += 1
+            job = {"id": job_id, "label": label, "sessions": names, "format": fmt, "state": "running",
+                   "rows": None, "error": None, "seconds": None, "submitted": time.time(),
+                   "filename": f"report_{_slug(label)}_{job_id}.{ext}"}
+            job["path"] = os.path.join(self.folder, job["filename"])
+            if self._pool is None: self._pool = ProcessPoolExecutor(max_workers=1)
+            future = self._pool.submit(build_report, spec, fmt, job["path"])
+            self._jobs.append(job)
+            self._prune()
+        future.add_done_callback(lambda f, job=job: self._finished(job, f))
+        return job_id
+
+    def _finished(self, job, future):
+        with self._lock:
+            job["seconds"] = time.time() - job["submitted"]
+            try:
+                job["rows"] = future.result()
+                job["state"] = "done"
+            except Exception as e:
+                job["state"], job["error"] = "failed", f"{type(e).__name__}: {e}"
+
+    def _prune(self):
+        """超出 keep 的旧任务连文件一起删 (还没跑完的不动)"""
+        finished = [j for j in self._jobs if j["state"] != "running"]
+        for job in finished[:max(0, len(self._jobs) - self.keep)]:
+            self._jobs.remove(job)
+            if os.path.exists(job["path"]): os.remove(job["path"])
+
+    def jobs(self):
+        """[{id, label, format, state: running/done/failed, rows, seconds, error, filename}], 新的在前"""
+        with self._lock: return [dict(j) for j in reversed(self._jobs)]
+
+    def busy(self):
+        with self._lock: return any(j["state"] == "running" for j in self._jobs)
+
+    def read(self, job_id):
+        with self._lock: job = next((j for j in self._jobs if j["id"] == job_id), None)
+        if job is None or job["state"] != "done": return None
+        with open(job["path"], 'rb') as f: return f.read()
@@ -0,0 +1,256 @@
+import os
+import pickle
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+
+import pandas as pd
+
+# ==========================================
+# 👥 名单 (全进程共用, 只读)
+# ==========================================
+
+_EMPTY = ('', 'nan', 'none', '-')
+
+
+def normalize_text(text):
+    """搜索用: 去重音 + casefold + 合并空格 ('Chloé  NG' -> 'chloe ng')"""
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(text.casefold().split())
+
+
+def _bigrams(word):
+    word = f" {word} "
+    return {word[i:i + 2] for i in range(len(word) - 1)}
+
+
+def normalize_email(email):
+    email = str(email).strip().lower()
+    return '' if email in _EMPTY else email
+
+
+class Roster:
+    """按列存成 tuple; 名字排序表和 name/email -> 行号 索引建一次, 之后只读"""
+
+    __slots__ = ('columns', '_cols', 'names', '_by_name', '_by_email', '_search')
+
+    def __init__(self, columns, cols):
+        self.columns = tuple(columns)
+        self._cols = {c: tuple(cols[c]) for c in self.columns}
+        names = self._cols.get('Name', ())
+        self._by_name = {}
+        for i, name in enumerate(names):
+            if str(name).strip().lower() in _EMPTY: continue
+            self._by_name.setdefault(name, i)  # 重名时跟以前一样取第一行
+        self.names = tuple(sorted(self._by_name))
+        self._by_email = {}
+        for i, email in enumerate(self._cols.get('Email', ())):
+            key = normalize_email(email)
+            if key: self._by_email.setdefault(key, i)
+        self._search = NameIndex(self.names)
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(df.columns, {c: df[c].tolist() for c in df.columns})
+
+    def __len__(self):
+        return len(self._cols.get('Name', ()))
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    def row(self, i):
+        return {c: self._cols[c][i] for c in self.columns}
+
+    def column(self, name):
+        return self._cols.get(name, ())
+
+    def by_name(self, name):
+        i = self._by_name.get(name)
+        return None if i is None else self.row(i)
+
+    def by_email(self, email):
+        i = self._by_email.get(normalize_email(email))
+        return None if i is None else self.row(i)
+
+    def search(self, query, k=8):
+        return self._search.search(query, k)
+
+    def to_frame(self):
+        return pd.DataFrame({c: list(v) for c, v in self._cols.items()}, columns=list(self.columns))
+
+
+class NameIndex:
+    """名字搜索: 整名前缀 -> 单词前缀 -> 单词 bigram 模糊 (打错字), 只返回 top-k"""
+
+    def __init__(self, names):
+        self.names = names
+        norm = [normalize_text(n) for n in names]
+        self._norm = norm
+        self._full = sorted((t, i) for i, t in enumerate(norm))
+        self._tokens = sorted((tok, i) for i, t in enumerate(norm) for tok in t.split())
+        # 模糊匹配: 不重复的单词 -> 名字, bigram -> 单词
+        self._vocab = {}
+        for tok, i in self._tokens:
+            self._vocab.setdefault(tok, []).append(i)
+        self._vocab_list = list(self._vocab)
+        self._grams = {}
+        for j, tok in enumerate(self._vocab_list):
+            for g in _bigrams(tok):
+                self._grams.setdefault(g, []).append(j)
+
+    @staticmethod
+    def _prefix_scan(pairs, prefix):
+        j = bisect_left(pairs, (prefix, -1))
+        while j < len(pairs) and pairs[j][0].startswith(prefix):
+            yield pairs[j][1]
+            j += 1
+
+    def _fuzzy(self, word, min_score=0.5):
+        """Dice 系数 >= min_score 的单词, 分数高的在前"""
+        q_grams = _bigrams(word)
+        counts = {}
+        for g in q_grams:
+            for j in self._grams.get(g, ()):
+                counts[j] = counts.get(j, 0) + 1
+        scored = []
+        for j, c in counts.items():
+            tok = self._vocab_list[j]
+            score = 2 * c / (len(q_grams) + len(tok) + 1)
+            if score >= min_score: scored.append((-score, tok))
+        scored.sort()
+        return [tok for _, tok in scored]
+
+    def search(self, query, k=8):
+        q = normalize_text(query)
+        if not q: return []
+        hits, seen = [], set()
+
+        def take(i):
+            if i not in seen:
+                seen.add(i)
+                hits.append(i)
+            return len(hits) >= k
+
+        # 1. 整个名字以 query 开头
+        for i in self._prefix_scan(self._full, q):
+            if take(i): return [self.names[i] for i in hits]
+        # 2. 每个词都是某个单词的前缀 ('tan al' 也能找到 'Alice Tan')
+        words = q.split()
+        for i in self._prefix_scan(self._tokens, words[0]):
+            if i in seen: continue
+            toks = self._norm[i].split()
+            if all(any(t.startswith(w) for t in toks) for w in words[1:]):
+                if take(i): return [self.names[i] for i in hits]
+        # 3. 前缀都找不到才当打错字: 用最长的词做 bigram 模糊匹配
+        longest = max(words, key=len)
+        if not hits and len(longest) >= 3:
+            for tok in self._fuzzy(longest):
+                for i in self._vocab[tok]:
+                    if take(i): return [self.names[i] for i in hits]
+        return [self.names[i] for i in hits]
+
+
+# ==========================================
+# 🔄 Stale-while-revalidate + 本地快照
+# ==========================================
+
+class RosterProvider:
+    """先用本地快照秒开; 过期后后台线程刷新, 刷新期间继续用旧名单"""
+
+    def __init__(self, fetch, snapshot_file, ttl=600, fallback=None, retry_after=30, watch_interval=1.0):
+        self.fetch = fetch            # 从 Sheets 拉名单, 失败要抛异常; None = 没有 Sheets, 只跟着快照文件走
+        self.fallback = fallback      # 没有快照时的冷启动退路
+        self.snapshot_file = snapshot_file
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self.watch_interval = watch_interval
+        self.last_refresh_duration = None
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._last_attempt = 0.0
+        self._last_watch = time.monotonic()
+        self._snapshot_sig = self._stat_sig()
+        self._roster, self._loaded_at = self._load_snapshot()
+        if self._roster is None and fetch is not None: self._refresh()
+        if self._roster is None and fallback is not None:
+            self._roster = Roster.from_frame(fallback())
+
+    def _stat_sig(self):
+        try: st = os.stat(self.snapshot_file)
+        except OSError: return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _watch_snapshot(self):
+        """别的进程 (app.py) 刷新后会重写快照; mtime 变了就重新读 (最多每 watch_interval 秒 stat 一次)"""
+        now = time.monotonic()
+        if now - self._last_watch < self.watch_interval: return
+        self._last_watch = now
+        sig = self._stat_sig()
+        if sig is None or sig == self._snapshot_sig: return
+        roster, saved_at = self._load_snapshot()
+        with self._lock:
+            self._snapshot_sig = sig
+            if roster is not None and (self._loaded_at is None or saved_at > self._loaded_at):
+                self._roster, self._loaded_at = roster, saved_at
+
+    def _load_snapshot(self):
+        try:
+            with open(self.snapshot_file, 'rb') as f: snap = pickle.load(f)
+            return Roster(snap['columns'], snap['cols']), snap['saved_at']
+        except (OSError, EOFError, pickle.UnpicklingError, KeyError, TypeError):
+            return None, None
+
+    def _save_snapshot(self, roster, saved_at):
+        snap = {'saved_at': saved_at, 'columns': roster.columns,
+                'cols': {c: roster.column(c) for c in roster.columns}}
+        tmp = self.snapshot_file + ".tmp"
+        with open(tmp, 'wb') as f: pickle.dump(snap, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.snapshot_file)
+        self._snapshot_sig = self._stat_sig()
+
+    def _refresh(self):
+        self._last_attempt = time.time()
+        t0 = time.perf_counter()
+        try:
+            roster = Roster.from_frame(self.fetch())
+            now = time.time()
+            with self._lock: self._roster, self._loaded_at = roster, now
+            self._save_snapshot(roster, now)
+            self.last_error = None
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"   # 保留上一份好的名单
+        finally:
+            self.last_refresh_duration = time.perf_counter() - t0
+            with self._lock: self._refreshing = False
+
+    def refresh_async(self):
+        if self.fetch is None: return False
+        with self._lock:
+            if self._refreshing: return False
+            self._refreshing = True
+            self._last_attempt = time.time()
+        threading.Thread(target=self._refresh, name="roster-refresh", daemon=True).start()
+        return True
+
+    def get(self):
+        """马上返回当前名单; 过期就顺便触发后台刷新"""
+        self._watch_snapshot()
+        if self.fetch is None: return self._roster
+        # 刷新失败后隔 retry_after 秒再试, 不要每次 rerun 都打 Sheets
+        age = self.age()
+        if (age is None or age > self.ttl) and time.time() - self._last_attempt > self.retry_after:
+            self.refresh_async()
+        return self._roster
+
+    def age(self):
+        """当前名单距上次成功刷新的秒数; 用的是冷启动退路名单时为 None"""
+        return None if self._loaded_at is None else time.time() - self._loaded_at
+
+    @property
+    def refreshing(self):
+        return self._refreshing
@@ -0,0 +1,128 @@
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+# ==========================================
+# 📋 Session 注册表 (mtime 变化才重新读 sessions.json)
+# ==========================================
+
+LATE_AFTER_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def parse_late_threshold(session):
+    """date + start + duration('15m'/'1hr') -> 迟到时间点; 解析失败返回 None"""
+    try:
+        start_str = f"{session['date']} {session['start']}"
+        fmt = "%Y-%m-%d %H:%M:%S" if start_str.count(':') == 2 else "%Y-%m-%d %H:%M"
+        session_start = datetime.strptime(start_str, fmt)
+        dur_str = str(session.get('duration', '1hr'))
+        if 'hr' in dur_str: mins = int(float(dur_str.replace('hr', '')) * 60)
+        else: mins = int(dur_str.replace('m', ''))
+        return session_start + timedelta(minutes=mins)
+    except (KeyError, ValueError, TypeError):
+        return None
+
+
+def validate_session(session):
+    """建 / 改 session 时解析一次迟到时间点并存进 late_after; 解析不了直接报错"""
+    threshold = parse_late_threshold(session)
+    if threshold is None:
+        raise ValueError(f"Invalid start/duration: {session.get('date')} {session.get('start')} + {session.get('duration')}")
+    return dict(session, late_after=threshold.strftime(LATE_AFTER_FORMAT))
+
+
+def _threshold(session):
+    """优先用建 session 时存下的 late_after, 旧数据才现场解析"""
+    try: return datetime.strptime(session['late_after'], LATE_AFTER_FORMAT)
+    except (KeyError, ValueError, TypeError): return parse_late_threshold(session)
+
+
+class SessionRegistry:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._sig = None
+        self._sessions = []
+        self._by_code = {}
+        self._thresholds = {}
+
+    def _stat_sig(self):
+        try: st = os.stat(self.path)
+        except FileNotFoundError: return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _index(self, sessions):
+        self._sessions = sessions
+        self._by_code = {str(s.get('code')): s for s in sessions if s.get('active', True)}
+        self._thresholds = {s.get('id'): _threshold(s) for s in sessions}
+
+    def _refresh(self):
+        sig = self._stat_sig()
+        if sig == self._sig: return
+        sessions = []
+        if sig is not None:
+            with open(self.path, 'r') as f: sessions = json.load(f)
+        self._index(sessions)
+        self._sig = sig
+
+    def _write(self, sessions):
+        """写临时文件再 rename, 读的人永远看到完整文件"""
+        folder = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(prefix=".sessions-", suffix=".tmp", dir=folder)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(sessions, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except BaseException:
+            if os.path.exists(tmp): os.remove(tmp)
+            raise
+        self._index(sessions)
+        self._sig = self._stat_sig()
+
+    # --- 读 ---
+    def all(self):
+        with self._lock:
+            self._refresh()
+            return list(self._sessions)
+
+    def active(self):
+        return [s for s in self.all() if s.get('active', True)]
+
+    def by_code(self, code):
+        """O(1) 按签到码找进行中的 session"""
+        with self._lock:
+            self._refresh()
+            return self._by_code.get(str(code))
+
+    def late_threshold(self, session):
+        with self._lock:
+            self._refresh()
+            if session.get('id') in self._thresholds: return self._thresholds[session.get('id')]
+        return _threshold(session)
+
+    # --- 写 (读-改-写都在锁里, 以磁盘上最新的为准) ---
+    def add(self, session):
+        session = validate_session(session)
+        with self._lock:
+            self._refresh()
+            self._write(self._sessions + [session])
+        return session
+
+    def update(self, session_id, **changes):
+        """改 date/start/duration 等字段, 重新算 late_after; 返回改好的 session (找不到返回 None)"""
+        with self._lock:
+            self._refresh()
+            current = next((s for s in self._sessions if s.get('id') == session_id), None)
+            if current is None: return None
+            updated = validate_session(dict(current, **changes))
+            self._write([updated if s.get('id') == session_id else s for s in self._sessions])
+        return updated
+
+    def remove(self, session_id):
+        with self._lock:
+            self._refresh()
+            self._write([s for s in self._sessions if s.get('id') != session_id])
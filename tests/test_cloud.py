@@ -0,0 +1,148 @@
+import json
+import time
+import uuid
+
+import pandas as pd
+import pytest
+
+from cloud import CloudWriteQueue, SyncLedger
+from fake_gsheets import FakeGSheetsConnection
+from logstore import CheckinStore
+
+COLUMNS = ["Timestamp", "Session", "Name", "Type", "Status", "Email", "Phone", "ID"]
+
+
+def make_rows(n, start=0, session="S1"):
+    return [{"Timestamp": f"2026-01-01 09:{(start + i) % 60:02d}:00", "Session": session, "Name": f"P{start + i}",
+             "Type": "Member", "Status": "On-time", "Email": "-", "Phone": "-", "ID": uuid.uuid4().hex}
+            for i in range(n)]
+
+
+def sheet_ids(conn):
+    return list(conn.sheets.get("Logs", pd.DataFrame(columns=COLUMNS))["ID"])
+
+
+@pytest.fixture
+def conn():
+    return FakeGSheetsConnection({"Logs": pd.DataFrame(columns=COLUMNS)})
+
+
+def make_queue(conn, tmp_path, **kwargs):
+    kwargs.setdefault("flush_interval", 3600)   # 测试里手动 flush, 后台线程不抢
+    return CloudWriteQueue(conn, COLUMNS, spill_file=str(tmp_path / "pending.jsonl"), **kwargs)
+
+
+def make_store(tmp_path, name="checkins.db", rows=()):
+    store = CheckinStore(str(tmp_path / name), COLUMNS)
+    inserted = store.append_many(list(rows))
+    for r in rows: r['_seq'] = inserted[r['ID']]
+    return store
+
+
+# --- 写入队列 ---
+def test_flush_failure_keeps_rows_then_retries(conn, tmp_path):
+    conn.fail_times = 2
+    q = make_queue(conn, tmp_path)
+    rows = make_rows(3)
+    q.enqueue_many(rows)
+    for _ in range(2):
+        with pytest.raises(ConnectionError): q.flush()
+        assert q.pending_count() == 3
+    assert q.flush() == 3
+    assert q.pending_count() == 0
+    assert sheet_ids(conn) == [r["ID"] for r in rows]
+
+
+def test_background_backoff_recovers(conn, tmp_path):
+    conn.fail_times = 2
+    q = make_queue(conn, tmp_path, flush_interval=0.02, max_backoff=0.1)
+    q.enqueue_many(make_rows(2))
+    deadline = time.time() + 5
+    while q.pending_count() and time.time() < deadline: time.sleep(0.02)
+    q.stop(flush=False)
+    assert q.pending_count() == 0
+    assert len(sheet_ids(conn)) == 2
+    assert q.last_error is None
+
+
+def test_spill_file_survives_crash(conn, tmp_path):
+    rows = make_rows(4)
+    crashed = make_queue(conn, tmp_path)
+    crashed.enqueue_many(rows)
+    # 进程挂掉: 没 flush, 重新开一个读同一个 spill 文件
+    with open(tmp_path / "pending.jsonl", "a") as f: f.write('{"half a line')
+    resumed = make_queue(conn, tmp_path)
+    assert resumed.pending_count() == 4
+    assert resumed.flush() == 4
+    assert sheet_ids(conn) == [r["ID"] for r in rows]
+    assert (tmp_path / "pending.jsonl").read_text() == ""
+
+
+# --- 增量同步 ---
+def test_delta_sync_pushes_only_rows_after_watermark(conn, tmp_path):
+    store = make_store(tmp_path, rows=make_rows(5))
+    ledger = SyncLedger(str(tmp_path / "sync_state.json"))
+    assert ledger.sync(conn, store, COLUMNS) == 5
+    reads = conn.calls["read"]
+
+    new = make_rows(3, start=5)
+    store.append_many(new)
+    assert ledger.sync(conn, store, COLUMNS) == 3
+    assert ledger.sync(conn, store, COLUMNS) == 0
+    assert conn.calls["read"] == reads   # 水位线对得上就不读云端
+    assert sheet_ids(conn)[-3:] == [r["ID"] for r in new]
+    assert json.loads((tmp_path / "sync_state.json").read_text())["synced_seq"] == store.max_seq()
+
+
+def test_queue_pushed_rows_are_not_synced_twice(conn, tmp_path):
+    store = make_store(tmp_path, rows=make_rows(2))
+    ledger = SyncLedger(str(tmp_path / "sync_state.json"))
+    ledger.sync(conn, store, COLUMNS)
+
+    q = make_queue(conn, tmp_path, ledger=ledger)
+    rows = make_rows(3, start=2)
+    inserted = store.append_many(rows)
+    for r in rows: r['_seq'] = inserted[r['ID']]
+    q.enqueue_many(rows)
+    q.flush()
+    assert ledger.state["pushed_ranges"] == [[3, 5]]
+    assert ledger.sync(conn, store, COLUMNS) == 0
+    assert ledger.state["pushed_ranges"] == []
+    assert len(sheet_ids(conn)) == 5
+
+
+def test_rows_synced_before_restart_are_not_flushed_again(conn, tmp_path):
+    rows = make_rows(3)
+    store = make_store(tmp_path, rows=rows)
+    crashed = make_queue(conn, tmp_path)
+    crashed.enqueue_many(rows)
+    # 队列没来得及 flush, Admin 先手动 sync 推了; 重启后 spill 里的行不能再推一次
+    SyncLedger(str(tmp_path / "sync_state.json")).sync(conn, store, COLUMNS)
+    resumed = make_queue(conn, tmp_path, ledger=SyncLedger(str(tmp_path / "sync_state.json")))
+    assert resumed.pending_count() == 3
+    resumed.flush()
+    assert resumed.pending_count() == 0
+    assert sheet_ids(conn) == [r["ID"] for r in rows]
+
+
+def test_replaced_db_triggers_full_reconcile(conn, tmp_path):
+    old = make_rows(3)
+    ledger = SyncLedger(str(tmp_path / "sync_state.json"))
+    ledger.sync(conn, make_store(tmp_path, "old.db", old), COLUMNS)
+    reads = conn.calls["read"]
+
+    # 新库: 前两行跟旧库同 ID, 顺序不同 -> 水位线那一行的 ID 对不上
+    extra = make_rows(2, start=3)
+    replaced = make_store(tmp_path, "new.db", [dict(old[1]), dict(old[0])] + extra)
+    assert ledger.sync(conn, replaced, COLUMNS) == 2
+    assert conn.calls["read"] == reads + 1
+    assert sheet_ids(conn) == [r["ID"] for r in old + extra]
+
+
+def test_full_reconcile_matches_legacy_rows_without_id(tmp_path):
+    rows = make_rows(3)
+    legacy = pd.DataFrame([{k: v for k, v in r.items() if k != "ID"} for r in rows[:2]])
+    conn = FakeGSheetsConnection({"Logs": legacy})
+    ledger = SyncLedger(str(tmp_path / "sync_state.json"))
+    assert ledger.sync(conn, make_store(tmp_path, rows=rows), COLUMNS) == 1
+    assert list(conn.sheets["Logs"]["Name"]) == ["P0", "P1", "P2"]
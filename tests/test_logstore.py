@@ -0,0 +1,77 @@
+import sqlite3
+import uuid
+
+import pandas as pd
+
+from attendance import AttendanceIndex, attendee_key
+from logstore import ATTENDEE_COLUMN, PARTITION_COLUMN, CheckinStore
+
+COLUMNS = ["Timestamp", "Session", "Name", "Type", "Status", "Email", "Phone", "ID"]
+SESSION = {"id": "1", "name": "Module 1"}
+
+
+def make_row(name, session=SESSION, user_type="Member", email="-"):
+    return {"Timestamp": "2026-01-01 09:00:00", "Session": session["name"], "Name": name, "Type": user_type,
+            "Status": "On-time", "Email": email, "Phone": "-", "ID": uuid.uuid4().hex,
+            PARTITION_COLUMN: session["id"], ATTENDEE_COLUMN: attendee_key(name, user_type, email)}
+
+
+def write_legacy_csv(tmp_path, names, session="Module 1"):
+    path = tmp_path / "local_backup_logs.csv"
+    pd.DataFrame([{"Timestamp": "2025-01-01 09:00:00", "Session": session, "Name": n, "Type": "Member",
+                   "Status": "On-time", "Email": "-", "Phone": "-"} for n in names]).to_csv(path, index=False)
+    return str(path)
+
+
+# --- 查重键 ---
+def test_distinct_roster_names_do_not_collide(tmp_path):
+    store = CheckinStore(str(tmp_path / "checkins.db"), COLUMNS)
+    names = ["Chloe Ng", "Chloé Ng", "Alice  Tan", "ALICE TAN"]
+    rows = [make_row(n) for n in names]
+    assert len(store.append_many(rows)) == 4
+    assert len(store.append_many([make_row("Chloé Ng")])) == 0   # 同一个人再签还是拒
+    index = AttendanceIndex(store)
+    assert index.reserve(SESSION, "Chloe Ng", "Member", "-", "t") == "2026-01-01 09:00:00"
+    assert index.reserve(SESSION, "Alice Tan", "Member", "-", "t") is None
+    # walk-in 还是按规范化的 email
+    assert attendee_key("A", "Walk-in", " Bob@X.com ") == attendee_key("B", "Walk-in", "bob@x.com")
+
+
+def test_old_normalized_keys_are_rewritten(tmp_path):
+    db = str(tmp_path / "checkins.db")
+    CheckinStore(db, COLUMNS).append_many([dict(make_row("Chloe Ng"), **{ATTENDEE_COLUMN: "name:chloe ng"})])
+    store = CheckinStore(db, COLUMNS)
+    assert len(store.append_many([make_row("Chloé Ng"), make_row("Chloe Ng")])) == 1
+
+
+# --- 迁移只做一次 ---
+def test_restart_does_not_backfill_legacy_rows_into_new_session(tmp_path):
+    db, csv = str(tmp_path / "checkins.db"), write_legacy_csv(tmp_path, ["Old Timer"])
+    store = CheckinStore(db, COLUMNS, legacy_csv=csv, legacy_partitions={})
+    assert [r[PARTITION_COLUMN] for r in store.rows_after(0)] == [None]
+    # 之后新建了同名的 session (id 99), 重启时旧行不能被它认领
+    store = CheckinStore(db, COLUMNS, legacy_csv=csv, legacy_partitions={"Module 1": "99"})
+    assert [r[PARTITION_COLUMN] for r in store.rows_after(0)] == [None]
+    assert store.rows_after(0, session_id="99") == []
+
+
+def test_partition_column_added_once_with_current_sessions(tmp_path):
+    db = str(tmp_path / "checkins.db")
+    conn = sqlite3.connect(db)
+    cols = ", ".join(f'"{c}" TEXT' for c in COLUMNS if c != "ID")
+    conn.execute(f'CREATE TABLE logs (seq INTEGER PRIMARY KEY AUTOINCREMENT, {cols}, "ID" TEXT UNIQUE)')
+    conn.execute('INSERT INTO logs ("Session", "Name", "ID") VALUES (?, ?, ?)', ("Module 1", "Old Timer", "x"))
+    conn.commit()
+    conn.close()
+    store = CheckinStore(db, COLUMNS, legacy_partitions={"Module 1": "1"})
+    assert [r[PARTITION_COLUMN] for r in store.rows_after(0)] == ["1"]
+
+
+def test_archived_legacy_rows_are_not_imported_again(tmp_path):
+    db, csv = str(tmp_path / "checkins.db"), write_legacy_csv(tmp_path, ["Old Timer", "Older Timer"])
+    store = CheckinStore(db, COLUMNS, legacy_csv=csv, legacy_partitions={"Module 1": "1"})
+    assert len(store.rows_after(0, session_id="1")) == 2
+    store.drop_partition("1", max_seq=store.max_seq())
+    assert store.rows_after(0) == []
+    store = CheckinStore(db, COLUMNS, legacy_csv=csv, legacy_partitions={"Module 1": "1"})
+    assert store.rows_after(0) == []